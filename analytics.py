@@ -0,0 +1,229 @@
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from sqlalchemy import select
+
+from cache import report_cache
+from models import db, AttendanceSummary, Subject, User, ALL_SUBJECTS
+
+# minimum attendance, in percent, a student must keep in every subject
+THRESHOLD = 75.0
+
+Matrix = namedtuple(
+    "Matrix",
+    ["usernames", "years", "divisions", "classes", "subjects", "present", "total"]
+)
+
+
+# =========================
+# MATRICES
+# =========================
+def load_matrix(year=None, division=None):
+    """Students x subjects present/total counts, read from the summaries.
+
+    Rows follow student id, columns subject id. `classes` gives each
+    student's index into the distinct (year, division) pairs. Three
+    queries, then the counts are scattered into the arrays in one step.
+    """
+    subjects = db.session.query(Subject.id, Subject.name).order_by(Subject.id).all()
+
+    students = select(User.id, User.username, User.year, User.division).where(
+        User.role == "student"
+    )
+    if year:
+        students = students.where(User.year == year)
+    if division:
+        students = students.where(User.division == division)
+    students = db.session.execute(students.order_by(User.id)).all()
+
+    counts = select(
+        AttendanceSummary.student_id,
+        AttendanceSummary.subject_id,
+        AttendanceSummary.present,
+        AttendanceSummary.total
+    ).where(AttendanceSummary.subject_id != ALL_SUBJECTS)
+    if year or division:
+        counts = counts.where(AttendanceSummary.student_id.in_(
+            select(User.id).where(
+                User.role == "student",
+                *([User.year == year] if year else []),
+                *([User.division == division] if division else [])
+            )
+        ))
+    # flattened straight off a Core result: np.array over ORM rows is slow
+    rows = db.session.connection().execute(counts).all()
+    counts = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 4)
+
+    student_ids = np.array([s.id for s in students], dtype=np.int64)
+    subject_ids = np.array([s.id for s in subjects], dtype=np.int64)
+    present = np.zeros((len(students), len(subjects)), dtype=np.int64)
+    total = np.zeros_like(present)
+
+    if len(student_ids) and len(subject_ids) and len(counts):
+        rows = np.searchsorted(student_ids, counts[:, 0]).clip(max=len(student_ids) - 1)
+        cols = np.searchsorted(subject_ids, counts[:, 1]).clip(max=len(subject_ids) - 1)
+        # summaries of non-students (or students filtered out) match no row
+        keep = (student_ids[rows] == counts[:, 0]) & (subject_ids[cols] == counts[:, 1])
+        present[rows[keep], cols[keep]] = counts[keep, 2]
+        total[rows[keep], cols[keep]] = counts[keep, 3]
+
+    years = [s.year or "" for s in students]
+    divisions = [s.division or "" for s in students]
+    _, classes = np.unique(
+        np.array([f"{y}\0{d}" for y, d in zip(years, divisions)], dtype=str),
+        return_inverse=True
+    )
+
+    return Matrix(
+        usernames=[s.username for s in students],
+        years=years,
+        divisions=divisions,
+        classes=classes.reshape(-1).astype(np.int64),
+        subjects=[s.name for s in subjects],
+        present=present,
+        total=total
+    )
+
+
+# =========================
+# VECTOR OPERATIONS
+# =========================
+def percentages(present, total):
+    """present / total in percent, NaN where there are no marks."""
+    return np.divide(
+        present * 100.0, total,
+        out=np.full(np.shape(total), np.nan), where=np.asarray(total) > 0
+    )
+
+
+def classes_needed(present, total, threshold=THRESHOLD):
+    """Consecutive classes to attend before present / total reaches
+    `threshold` percent; 0 where it already does.
+
+    Smallest x with (present + x) / (total + x) >= threshold / 100.
+    """
+    shortfall = (threshold * np.asarray(total) - 100.0 * np.asarray(present)) / (100.0 - threshold)
+    # the epsilon keeps exact answers such as 4.0000000001 from rounding up
+    return np.maximum(np.ceil(shortfall - 1e-9), 0).astype(np.int64)
+
+
+def class_ranks(scores, classes):
+    """Competition rank (1 = highest score) of each score within its class,
+    and the number of ranked scores in that class; both 0 for NaN scores."""
+    ranked = ~np.isnan(scores)
+    if not ranked.any():
+        zeros = np.zeros(len(scores), dtype=np.int64)
+        return zeros, zeros
+
+    # class first, then score descending, in one sortable key
+    base = classes * 1000.0
+    key = base + (100.0 - np.where(ranked, scores, 0))
+    ordered = np.sort(key[ranked])
+    ranks = np.searchsorted(ordered, key) - np.searchsorted(ordered, base) + 1
+    sizes = np.bincount(classes[ranked], minlength=classes.max() + 1)[classes]
+    return np.where(ranked, ranks, 0), np.where(ranked, sizes, 0)
+
+
+def percentile_ranks(scores):
+    """Percent of ranked scores at or below each score; NaN stays NaN."""
+    ranked = np.sort(scores[~np.isnan(scores)])
+    if not len(ranked):
+        return np.full(len(scores), np.nan)
+    at_or_below = np.searchsorted(ranked, scores, side="right")
+    return np.where(np.isnan(scores), np.nan, at_or_below * 100.0 / len(ranked))
+
+
+# =========================
+# AT-RISK REPORT
+# =========================
+def _rounded(values):
+    """Python floats rounded to 2 places, None for NaN."""
+    return [None if v != v else v for v in np.round(values, 2).tolist()]
+
+
+def at_risk_report(threshold=THRESHOLD, year=None, division=None):
+    """Students below `threshold` percent overall or in any subject.
+
+    For each: the failing subjects with the consecutive classes needed to
+    recover, the overall percentage, rank in class and percentile. Plain
+    lists and dicts, lowest overall first, so the result can be cached.
+    """
+    if not 0 < threshold < 100:
+        raise ValueError("Threshold must be between 0 and 100")
+
+    m = load_matrix(year, division)
+    pct = percentages(m.present, m.total)
+    needed = classes_needed(m.present, m.total, threshold)
+    below = pct < threshold
+
+    overall_present = m.present.sum(axis=1)
+    overall_total = m.total.sum(axis=1)
+    overall = percentages(overall_present, overall_total)
+    ranks, class_sizes = class_ranks(overall, m.classes)
+
+    risky = np.flatnonzero(below.any(axis=1) | (overall < threshold))
+    risky = risky[np.argsort(overall[risky], kind="stable")]
+
+    # only the rows that are reported are turned into Python objects
+    columns = zip(
+        risky.tolist(),
+        overall_present[risky].tolist(),
+        overall_total[risky].tolist(),
+        _rounded(overall[risky]),
+        classes_needed(overall_present[risky], overall_total[risky], threshold).tolist(),
+        ranks[risky].tolist(),
+        class_sizes[risky].tolist(),
+        _rounded(percentile_ranks(overall)[risky]),
+        below[risky].tolist(),
+        m.present[risky].tolist(),
+        m.total[risky].tolist(),
+        _rounded(pct[risky]),
+        needed[risky].tolist()
+    )
+
+    students = []
+    for (i, present, total, percentage, need, rank, size, percentile,
+         failing, sub_present, sub_total, sub_pct, sub_need) in columns:
+        students.append({
+            "student": m.usernames[i],
+            "year": m.years[i],
+            "division": m.divisions[i],
+            "present": present,
+            "total": total,
+            "percentage": percentage,
+            "needed": need,
+            "class_rank": rank,
+            "class_size": size,
+            "percentile": percentile,
+            "subjects": [
+                {
+                    "subject": m.subjects[j],
+                    "present": sub_present[j],
+                    "total": sub_total[j],
+                    "percentage": sub_pct[j],
+                    "needed": sub_need[j]
+                }
+                for j, low in enumerate(failing) if low
+            ]
+        })
+
+    return {
+        "threshold": threshold,
+        "students_considered": len(m.usernames),
+        "subjects": m.subjects,
+        "at_risk_per_subject": dict(zip(m.subjects, below.sum(axis=0).tolist())),
+        "average_per_subject": dict(zip(
+            m.subjects,
+            _rounded(percentages(m.present.sum(axis=0), m.total.sum(axis=0)))
+        )),
+        "students": students
+    }
+
+
+def cached_at_risk_report(threshold=THRESHOLD, year=None, division=None):
+    return report_cache.cached(
+        "at_risk", {"threshold": threshold, "year": year, "division": division},
+        ("attendance", "users", "subjects"),
+        lambda: at_risk_report(threshold, year, division)
+    )
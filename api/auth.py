@@ -1,11 +1,22 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import check_password_hash
+from flask import Blueprint, g, request, jsonify
+from flask_jwt_extended import create_access_token, get_jwt_identity
+from limits import login_throttle
 from models import db, User
+from passwords import passwords
 
 # ✅ THIS IS WHAT app.py IS TRYING TO IMPORT
 auth_bp = Blueprint("auth_bp", __name__, url_prefix="/api/auth")
 
 
+def token_user():
+    """The User the request's token was issued to, loaded once per request;
+    None once the account is locked or deleted, so tokens stop working."""
+    if "_api_user" not in g:
+        user = User.query.filter_by(username=get_jwt_identity()["username"]).first()
+        g._api_user = user if user is not None and user.is_active else None
+    return g._api_user
+
+
 @auth_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json()
@@ -19,22 +30,44 @@ def login():
             "message": "Username and password required"
         }), 400
 
+    wait = login_throttle.retry_after(username)
+    if wait:
+        return jsonify({
+            "status": "error",
+            "message": "Too many failed attempts",
+            "retry_after": wait
+        }), 429, {"Retry-After": str(wait)}
+
     user = User.query.filter_by(username=username).first()
 
     if not user:
+        login_throttle.failed(username)
         return jsonify({
             "status": "error",
             "message": "User not found"
         }), 404
 
-    if not check_password_hash(user.password, password):
+    if not passwords.check(user, password):
+        login_throttle.failed(username)
         return jsonify({
             "status": "error",
             "message": "Invalid password"
         }), 401
 
+    if not user.is_active:
+        return jsonify({
+            "status": "error",
+            "message": "Account locked"
+        }), 403
+
+    # commits a hash upgraded by passwords.check
+    db.session.commit()
+
     return jsonify({
         "status": "success",
         "username": user.username,
-        "role": user.role
+        "role": user.role,
+        "access_token": create_access_token(
+            identity={"username": user.username, "role": user.role}
+        )
     })
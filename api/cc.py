@@ -1,30 +1,75 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Attendance, User
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+from api.auth import token_user
+from archive import archives
+from reports import cc_report_data, percent
+from cache import report_cache
+from database import read_replica
+from responses import versioned
 
 api_cc = Blueprint("api_cc", __name__)
 
+
+def current_cc():
+    user = token_user()
+    return user if user is not None and user.role == "cc" else None
+
+
 @api_cc.route("/api/cc/report", methods=["GET"])
 @jwt_required()
+@read_replica
+@versioned(lambda: ["attendance", "users", "subjects"] if current_cc() else None)
 def cc_report():
-    user = get_jwt_identity()
-
-    if user["role"] != "cc":
+    if current_cc() is None:
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
-    students = User.query.filter_by(role="student").all()
-    report = []
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Academic year not archived"}), 404
 
-    for s in students:
-        records = Attendance.query.filter_by(student=s.username).all()
-        present = sum(r.status == "Present" for r in records)
-        total = len(records)
+    if academic_year is not None:
+        _, rows = report_cache.cached(
+            "cc_report_data", {"academic_year": academic_year}, ("archive",),
+            lambda: archives.cc_report_data(academic_year)
+        )
+    else:
+        _, rows = report_cache.cached(
+            "cc_report_data", {}, ("attendance", "users", "subjects"), cc_report_data
+        )
+    report = []
 
+    for r in rows:
         report.append({
-            "student": s.username,
-            "present": present,
-            "total": total,
-            "percentage": round((present / total) * 100, 2) if total else 0
+            "student": r["student"],
+            "present": r["present"],
+            "total": r["total"],
+            "percentage": percent(r["present"], r["total"]) or 0
         })
 
     return jsonify({"status": "success", "report": report})
+
+
+@api_cc.route("/api/cc/at_risk", methods=["GET"])
+@jwt_required()
+@read_replica
+@versioned(lambda: ["attendance", "users", "subjects"] if current_cc() else None)
+def at_risk():
+    """Students below ?threshold= (default 75) percent overall or in any
+    subject, with the classes each needs to attend to recover."""
+    if current_cc() is None:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    # NumPy is only imported by the workers that serve this endpoint
+    from analytics import THRESHOLD, cached_at_risk_report
+
+    try:
+        report = cached_at_risk_report(
+            request.args.get("threshold", THRESHOLD, type=float),
+            request.args.get("year") or None,
+            request.args.get("division") or None
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({"status": "success", **report})
@@ -1,40 +1,141 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Attendance
+import json
+from datetime import date, timedelta
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from api.auth import token_user
+from archive import archives
+from bitmaps import day_grid, window_percentage
+from history import PAGE_SIZE, MAX_PAGE_SIZE, history_page, iter_history
+from responses import versioned
+from summaries import get_summary, get_subject_summaries
+from versions import student_version_key
 
 api_student = Blueprint("api_student", __name__)
 
+
+def current_student():
+    user = token_user()
+    return user if user is not None and user.role == "student" else None
+
+
+def student_versions():
+    student = current_student()
+    if student is None:
+        return None
+    return [student_version_key(student.id), "subjects"]
+
+
 @api_student.route("/api/student/dashboard", methods=["GET"])
 @jwt_required()
+@versioned(student_versions)
 def student_dashboard():
-    user = get_jwt_identity()
-
-    if user["role"] != "student":
+    student = current_student()
+    if student is None:
         return jsonify({"status": "error", "message": "Unauthorized"}), 403
 
-    records = Attendance.query.filter_by(student=user["username"]).all()
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Academic year not archived"}), 404
 
-    present = sum(r.status == "Present" for r in records)
-    absent = sum(r.status == "Absent" for r in records)
+    if academic_year is not None:
+        overall, subjects, _ = archives.student_year(academic_year, student.id)
+        return jsonify({
+            "status": "success",
+            "username": student.username,
+            "academic_year": academic_year,
+            "present_days": overall["present"],
+            "absent_days": overall["absent"],
+            "subjects": [{"subject": name, **counts} for name, counts in subjects]
+        })
 
-    streak = 0
-    for r in sorted(records, key=lambda x: x.date, reverse=True):
-        if r.status == "Present":
-            streak += 1
-        else:
-            break
+    summary = get_summary(student.id)
 
     return jsonify({
         "status": "success",
-        "username": user["username"],
-        "present_days": present,
-        "absent_days": absent,
-        "streak": streak,
-        "records": [
+        "username": student.username,
+        "present_days": summary.present,
+        "absent_days": summary.absent,
+        "streak": summary.streak,
+        "subjects": [
             {
-                "subject": r.subject,
-                "status": r.status,
-                "date": r.date.isoformat()
-            } for r in records
+                "subject": name,
+                "present": s.present,
+                "absent": s.absent,
+                "total": s.total
+            } for name, s in get_subject_summaries(student.id)
+        ]
+    })
+
+
+@api_student.route("/api/student/history", methods=["GET"])
+@jwt_required()
+@versioned(student_versions)
+def student_history():
+    """Attendance history, newest first.
+
+    Paged with ?cursor=<next_cursor>&limit=N, or streamed in full as
+    NDJSON (one record per line) with ?format=ndjson.
+    """
+    student = current_student()
+    if student is None:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    if request.args.get("format") == "ndjson":
+        lines = (json.dumps(r) + "\n" for r in iter_history(student.id))
+        return Response(
+            stream_with_context(lines),
+            mimetype="application/x-ndjson"
+        )
+
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    try:
+        records, next_cursor = history_page(
+            student.id, request.args.get("cursor"), limit
+        )
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+
+    return jsonify({
+        "status": "success",
+        "records": records,
+        "next_cursor": next_cursor
+    })
+
+
+def calendar_month():
+    return request.args.get("month") or date.today().strftime("%Y-%m")
+
+
+@api_student.route("/api/student/calendar", methods=["GET"])
+@jwt_required()
+@versioned(student_versions, calendar_month)
+def student_calendar():
+    """Marks per day for a month heatmap (?month=YYYY-MM, default this
+    month) and the attendance percentage over that month."""
+    student = current_student()
+    if student is None:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    try:
+        start = date.fromisoformat(calendar_month() + "-01")
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid month"}), 400
+    end = date(start.year + start.month // 12, start.month % 12 + 1, 1) - timedelta(days=1)
+
+    present, total, percentage = window_percentage(student.id, start, end)
+
+    return jsonify({
+        "status": "success",
+        "month": start.strftime("%Y-%m"),
+        "present": present,
+        "total": total,
+        "percentage": percentage,
+        "days": [
+            {"date": day.isoformat(), "present": p, "absent": a}
+            for day, (p, a) in day_grid(student.id, start, end).items()
         ]
     })
@@ -0,0 +1,78 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
+from sqlalchemy.exc import IntegrityError
+
+from api.auth import token_user
+from models import db
+from sync import PAGE_SIZE, MAX_PAGE_SIZE, MAX_UPLOAD, apply_offline_marks, changes_since
+
+api_sync = Blueprint("api_sync", __name__)
+
+
+@api_sync.route("/api/sync/attendance", methods=["GET"])
+@jwt_required()
+def attendance_changes():
+    """Marks changed since ?since=<token>, oldest first.
+
+    Students get their own marks, teachers their subject's (optionally
+    ?year=&division=). Start with no token, keep the returned one, and
+    call again straight away while "more" is true.
+    """
+    user = token_user()
+    if user is None:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+    if user.role == "student":
+        scope = {"student_id": user.id}
+    elif user.role == "teacher" and user.subject_id:
+        scope = {
+            "subject_id": user.subject_id,
+            "year": request.args.get("year") or None,
+            "division": request.args.get("division") or None
+        }
+    else:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    limit = request.args.get("limit", PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    try:
+        records, token, more = changes_since(request.args.get("since"), limit, **scope)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid sync token"}), 400
+
+    return jsonify({
+        "status": "success",
+        "records": records,
+        "since": token,
+        "more": more
+    })
+
+
+@api_sync.route("/api/sync/marks", methods=["POST"])
+@jwt_required()
+def upload_marks():
+    """Apply marks a teacher took offline, as {"marks": [{"key", "student",
+    "date", "status", "base"}, ...]}, all in one transaction. Safe to retry:
+    marks are applied once per key."""
+    user = token_user()
+    if user is None or user.role != "teacher" or not user.subject_id:
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True)
+    marks = data.get("marks") if isinstance(data, dict) else None
+    if not isinstance(marks, list) or not all(isinstance(m, dict) for m in marks):
+        return jsonify({"status": "error", "message": "marks must be a list of objects"}), 400
+    if len(marks) > MAX_UPLOAD:
+        return jsonify({
+            "status": "error",
+            "message": f"At most {MAX_UPLOAD} marks per upload"
+        }), 400
+
+    try:
+        results = apply_offline_marks(user.id, user.subject_id, marks)
+    except IntegrityError:
+        # the same keys uploaded concurrently; retrying reports them as duplicates
+        db.session.rollback()
+        return jsonify({"status": "error", "message": "Upload in progress, retry"}), 409
+
+    return jsonify({"status": "success", "results": results})
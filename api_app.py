@@ -0,0 +1,88 @@
+"""The JSON API for the mobile app (the api/ blueprints) as its own app.
+
+It runs on threads, so one slow CC report does not hold a whole process,
+with per-endpoint concurrency limits (limits.py) on top:
+
+    gunicorn api_app:app --worker-class gthread --workers 2 --threads 32
+
+or on an ASGI server through asgiref (pip install asgiref uvicorn):
+
+    uvicorn --factory api_app:create_asgi_app --workers 2
+
+Deployed next to the web app (render.yaml), both are served by one
+process so they share the database file, archives and caches on its disk:
+
+    gunicorn 'api_app:create_site()' --worker-class gthread --workers 2 --threads 32
+"""
+import os
+
+from flask import Flask
+from flask_jwt_extended import JWTManager
+
+from api.auth import auth_bp
+from api.cc import api_cc
+from api.student import api_student
+from api.sync import api_sync
+from archive import archives
+from cache import report_cache
+from database import configure_database, init_database
+from limits import concurrency_limits, login_throttle, parse_limits
+from metrics import metrics
+from models import db
+from passwords import passwords
+from responses import compression
+
+# requests in flight per endpoint and process; the CC report is the slow one
+DEFAULT_LIMITS = {"api_cc.cc_report": 4, "*": 64}
+
+# =========================
+# APP SETUP
+# =========================
+app = Flask(__name__)
+
+# anyone holding the key can mint tokens for any role, so there is no default
+app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY")
+if not app.config["JWT_SECRET_KEY"]:
+    raise RuntimeError("Set JWT_SECRET_KEY before starting the API")
+# the blueprints use {"username", "role"} as the token identity
+app.config["JWT_VERIFY_SUB"] = False
+app.config["API_CONCURRENCY"] = {
+    **DEFAULT_LIMITS, **parse_limits(os.environ.get("API_CONCURRENCY"))
+}
+
+configure_database(app)
+app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+init_database(app, db)
+report_cache.init_app(app)
+metrics.init_app(app)
+concurrency_limits.init_app(app)
+compression.init_app(app)
+passwords.init_app(app)
+login_throttle.init_app(app)
+archives.init_app(app)
+JWTManager(app)
+
+for blueprint in (auth_bp, api_cc, api_student, api_sync):
+    app.register_blueprint(blueprint)
+
+
+def create_site():
+    """The web app with this one mounted on /api/, as a single WSGI app."""
+    from app import create_app
+
+    web_app = create_app()
+
+    def site(environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        target = app if path.startswith("/api/") else web_app
+        return target(environ, start_response)
+
+    return site
+
+
+def create_asgi_app():
+    """ASGI entry point; Flask views still run on asgiref's thread pool."""
+    from asgiref.wsgi import WsgiToAsgi
+
+    return WsgiToAsgi(app)
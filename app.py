@@ -1,140 +1,170 @@
-
-
-
-CC_REPORT_CACHE = []
-
-
-from flask import request
-
 from flask import (
-    Flask, render_template, request,
-    redirect, url_for, flash, send_file, jsonify
+    Blueprint, Flask, current_app, render_template, request,
+    redirect, url_for, flash, send_file, jsonify,
+    Response, stream_with_context
 )
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import (
-    LoginManager, UserMixin,
+    LoginManager,
     login_user, login_required,
     logout_user, current_user
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import date
-from io import BytesIO
-
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+from datetime import date, timedelta
+
+import click
+
+from archive import archives, year_label
+from models import db, User, Attendance
+from database import configure_database, init_database, read_replica
+from reports import daily_summary, generate_cc_report, monthly_report
+from cache import report_cache
+from metrics import metrics
+from limits import login_throttle
+from passwords import passwords
+from migrations import bootstrap, upgrade
+from marking import normalize_status, record_marks, resolve_students
+from users import (
+    ROLES, IMPORT_COLUMNS, MAX_IMPORT_BYTES, count_users, filter_users,
+    import_status, import_users, start_import, user_page, valid_import_key
+)
+from exports import (
+    artifact_path, job_status, report_key, start_job, valid_key,
+    EXPORT_FORMATS, iter_attendance, stream_csv
+)
+from versions import bump, class_version_key, student_version_key
+from responses import compression, versioned
+from identity import subject_cache
+from summaries import get_summary, rebuild_summaries
 
 # =========================
 # APP SETUP
 # =========================
-app = Flask(__name__)
-app.secret_key = "secretkey"
-
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///attendance.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# every page and CLI command; create_app() registers it on an app
+web = Blueprint("web", __name__, cli_group=None)
 
-db = SQLAlchemy(app)
-
-login_manager = LoginManager(app)
-login_manager.login_view = "login"
+login_manager = LoginManager()
+login_manager.login_view = "web.login"
 
 SETUP_KEY = "VERNEKAR"
 
-# =========================
-# MODELS
-# =========================
-class Subject(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-
-
-class User(db.Model, UserMixin):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
-
-    year = db.Column(db.String(10))
-    division = db.Column(db.String(5))
-    phone = db.Column(db.String(20))
-    is_active = db.Column(db.Boolean, default=True)
-
-    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"))
-
-
-class Attendance(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    student = db.Column(db.String(80), nullable=False)
-    subject = db.Column(db.String(50), nullable=False)
-    status = db.Column(db.String(10), nullable=False)
-    date = db.Column(db.Date, nullable=False)
 
-def get_cc_report_data():
-    report_data = []
-
-    students = (
-        Attendance.query
-        .with_entities(Attendance.student_name)
-        .distinct()
-        .all()
+def create_app(config=None):
+    """Build the web app. `config` is applied before the extensions read
+    their settings. Importing this module touches neither the database nor
+    ReportLab, so gunicorn can preload it (see gunicorn.conf.py); create
+    the schema once per deploy with `flask --app app init-db`.
+    """
+    app = Flask(__name__)
+    app.secret_key = "secretkey"
+
+    configure_database(app)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.update(config or {})
+
+    init_database(app, db)
+    report_cache.init_app(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    passwords.init_app(app)
+    login_throttle.init_app(app)
+    archives.init_app(app)
+    login_manager.init_app(app)
+
+    app.register_blueprint(web)
+    return app
+
+
+# =========================
+# CLI
+# =========================
+@web.cli.command("init-db")
+def init_db():
+    """Create missing tables and the default subjects; safe to run on every deploy."""
+    created = bootstrap()
+    for name in created:
+        print(f"Created subject {name}")
+    print("Database ready")
+
+
+@web.cli.command("upgrade-db")
+def upgrade_db():
+    """Add missing tables, columns and indexes to an existing attendance.db."""
+    result = upgrade()
+    if result["migrated"]:
+        migrated, unmapped = result["migrated"]
+        print(f"Migrated {migrated} attendance rows to id keys")
+        if unmapped:
+            print(f"{unmapped} rows reference unknown students or subjects; "
+                  f"they remain in the attendance_legacy table")
+    for name in result["columns"]:
+        print(f"Added column {name}")
+    print(f"Removed {result['removed']} duplicate attendance rows")
+    for name in result["created"]:
+        print(f"Created index {name}")
+
+
+@web.cli.command("rebuild-summaries")
+def rebuild_summaries_command():
+    """Recompute the per-student attendance counters and daily rollup from scratch."""
+    print(f"Wrote {rebuild_summaries()} summary and rollup rows")
+
+
+@web.cli.command("archive-years")
+@click.option("--year", "academic_year", type=int,
+              help="one academic year, by the year it starts in")
+def archive_years_command(academic_year):
+    """Move closed academic years out of the attendance table into archives."""
+    try:
+        results = (
+            [archives.archive_year(academic_year)] if academic_year
+            else archives.archive_closed_years()
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for result in results:
+        if result["rows"]:
+            print(f"Archived {result['rows']} marks from "
+                  f"{year_label(result['academic_year'])} to {result['path']}")
+    if not any(r["rows"] for r in results):
+        print("No closed academic years to archive")
+
+
+@web.cli.command("import-users")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--workers", type=int, help="password hashing processes")
+def import_users_command(csv_file, workers):
+    """Create users from a CSV (see users.IMPORT_COLUMNS)."""
+    result = import_users(csv_file, workers=workers)
+    for line, message in result["errors"]:
+        print(f"line {line}: {message}")
+    print(f"Created {result['created']} users in {result['seconds']}s "
+          f"({result['per_sec']}/s), {len(result['errors'])} rows rejected")
+
+
+@web.cli.command("export-attendance")
+@click.option("--from", "start", type=click.DateTime(["%Y-%m-%d"]))
+@click.option("--to", "end", type=click.DateTime(["%Y-%m-%d"]))
+@click.option("--year")
+@click.option("--division")
+@click.option("--subject-id", type=int)
+@click.option("--format", "fmt", type=click.Choice(list(EXPORT_FORMATS)), default="csv")
+@click.option("--output", "-o", type=click.File("wb"), default="-")
+def export_attendance_command(start, end, year, division, subject_id, fmt, output):
+    """Write raw attendance rows as CSV, in constant memory."""
+    rows = iter_attendance(
+        start and start.date(), end and end.date(), year, division, subject_id
     )
-
-    for (student_name,) in students:
-        records = Attendance.query.filter_by(
-            student_name=student_name
-        ).all()
-
-        subjects = {
-            "python": None,
-            "java": None,
-            "mic": None,
-            "es": None,
-            "dcn": None,
-        }
-
-        total = 0
-        count = 0
-
-        for r in records:
-            subject_key = r.subject.strip().lower()
-
-            if subject_key in subjects:
-                subjects[subject_key] = r.percentage
-                total += r.percentage
-                count += 1
-
-        total_percent = round(total / count, 2) if count > 0 else 0.0
-
-        report_data.append({
-            "student": student_name,
-            "python": subjects["python"],
-            "java": subjects["java"],
-            "mic": subjects["mic"],
-            "es": subjects["es"],
-            "dcn": subjects["dcn"],
-            "total": total_percent
-        })
-
-    return report_data
-
-
-# =========================
-# INIT DB
-# =========================
-with app.app_context():
-    db.create_all()
-    for s in ["Python", "Java", "MIC", "ES", "DCN"]:
-        if not Subject.query.filter_by(name=s).first():
-            db.session.add(Subject(name=s))
-    db.session.commit()
+    for chunk in stream_csv(rows, compress=fmt == "csv.gz"):
+        output.write(chunk)
 
 # =========================
 # LOGIN MANAGER
 # =========================
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # locked users are logged out on their next request
+    user = db.session.get(User, int(user_id))
+    return user if user is not None and user.is_active else None
 
 # =========================
 # HELPERS
@@ -143,94 +173,68 @@ def admin_exists():
     return User.query.filter_by(role="admin").first() is not None
 
 
-def generate_cc_report():
-    students = User.query.filter_by(role="student").all()
-    subjects = [s.name for s in Subject.query.all()]
-    report = []
+MAX_RANGE_DAYS = 366
 
-    for student in students:
-        row = {"student": student.username}
-        total_present = 0
-        total_classes = 0
+# marks in one /mark_bulk request
+MAX_BULK_MARKS = 1000
 
-        for sub in subjects:
-            records = Attendance.query.filter_by(
-                student=student.username,
-                subject=sub
-            ).all()
 
-            if records:
-                present = sum(r.status == "Present" for r in records)
-                percent = round((present / len(records)) * 100, 2)
-                row[sub] = percent
-                total_present += present
-                total_classes += len(records)
-            else:
-                row[sub] = None
+def report_range(args):
+    """(start, end) from ?month=YYYY-MM or ?from=&to= ISO dates, defaulting
+    to the current month. Raises ValueError on a bad or oversized range."""
+    if args.get("from") or args.get("to"):
+        start = date.fromisoformat(args["from"])
+        end = date.fromisoformat(args["to"])
+    else:
+        month = args.get("month") or date.today().strftime("%Y-%m")
+        start = date.fromisoformat(month + "-01")
+        end = date(
+            start.year + start.month // 12, start.month % 12 + 1, 1
+        ) - timedelta(days=1)
 
-        row["total"] = round(
-            (total_present / total_classes) * 100, 2
-        ) if total_classes else None
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError("Invalid date range")
+    return start, end
 
-        report.append(row)
 
-    return report
+def archive_choices():
+    """[(academic year, label)] for the year pickers, newest first."""
+    return [(y, year_label(y)) for y in reversed(archives.years())]
 
 
+def monthly_chart_versions():
+    if current_user.role != "teacher":
+        return None
+    return [
+        class_version_key(request.args.get("year"), request.args.get("division")),
+        "users",
+        "subjects"
+    ]
 
-def get_cc_report_data():
-    report = {}
 
-    records = Attendance.query.all()
+def monthly_chart_inputs():
+    """What /monthly_chart reads besides the URL: the teacher's subject and
+    the range, which moves with the current month."""
+    try:
+        return current_user.subject_id, report_range(request.args)
+    except (KeyError, ValueError):
+        return current_user.subject_id, None
 
-    for att in records:
-        student = (
-            getattr(att, "student", None)
-            or getattr(att, "username", None)
-            or getattr(att, "roll_no", None)
-        )
 
-        if not student:
-            continue
-
-        if student not in report:
-            report[student] = {
-                "python": None,
-                "java": None,
-                "mic": None,
-                "es": None,
-                "dcn": None
-            }
-
-        subject = getattr(att, "subject", None)
-        percent = getattr(att, "percentage", None)
-
-        if subject:
-            key = subject.lower()
-            if key in report[student]:
-                report[student][key] = percent
-
-    final = []
-    for student, subs in report.items():
-        values = [v for v in subs.values() if v is not None]
-        total = round(sum(values) / len(values), 2) if values else 0.0
-
-        final.append({
-            "student": student,
-            "python": subs["python"],
-            "java": subs["java"],
-            "mic": subs["mic"],
-            "es": subs["es"],
-            "dcn": subs["dcn"],
-            "total": total
-        })
-
-    return final
+def cached_cc_report(academic_year=None):
+    if academic_year is not None:
+        return report_cache.cached(
+            "cc_report", {"academic_year": academic_year}, ("archive",),
+            lambda: generate_cc_report(academic_year)
+        )
+    return report_cache.cached(
+        "cc_report", {}, ("attendance", "users", "subjects"), generate_cc_report
+    )
 
 # =========================
 # SETUP
 # =========================
-@app.route("/setup", methods=["GET", "POST"])
+@web.route("/setup", methods=["GET", "POST"])
 def setup():
     if admin_exists():
         return redirect("/")
@@ -242,7 +246,7 @@ def setup():
         else:
             admin = User(
                 username="admin",
-                password=generate_password_hash("admin123"),
+                password=passwords.hash("admin123"),
                 role="admin"
             )
             db.session.add(admin)
@@ -254,24 +258,31 @@ def setup():
 # =========================
 # LOGIN / LOGOUT
 # =========================
-@app.route("/", methods=["GET", "POST"])
+@web.route("/", methods=["GET", "POST"])
 def login():
     if not admin_exists():
         return redirect("/setup")
 
     if request.method == "POST":
-        user = User.query.filter_by(
-            username=request.form.get("username")
-        ).first()
-
-        if not user or not check_password_hash(
-            user.password, request.form.get("password")
-        ):
+        username = request.form.get("username")
+        wait = login_throttle.retry_after(username)
+        if wait:
+            return render_template(
+                "login.html",
+                error=f"Too many failed attempts, try again in {wait} s"
+            ), 429, {"Retry-After": str(wait)}
+
+        user = User.query.filter_by(username=username).first()
+
+        if not user or not passwords.check(user, request.form.get("password")):
+            login_throttle.failed(username)
             return render_template("login.html", error="Invalid credentials")
 
         if not user.is_active:
             return render_template("login.html", error="Account locked")
 
+        # commits a hash upgraded by passwords.check
+        db.session.commit()
         login_user(user)
 
         if user.role == "admin":
@@ -285,7 +296,7 @@ def login():
     return render_template("login.html")
 
 
-@app.route("/logout")
+@web.route("/logout")
 @login_required
 def logout():
     logout_user()
@@ -294,30 +305,58 @@ def logout():
 # =========================
 # ADMIN
 # =========================
-@app.route("/admin")
+@web.route("/admin")
 @login_required
 def admin():
-    page = request.args.get("page", 1, type=int)
+    if current_user.role != "admin":
+        return redirect("/")
+
     per_page = 10
 
-    users_paginated = User.query.order_by(User.id).paginate(
-        page=page,
-        per_page=per_page,
-        error_out=False
+    filters = {
+        "role": request.args.get("role") or None,
+        "year": request.args.get("year") or None,
+        "division": request.args.get("division") or None,
+        "q": request.args.get("q", "").strip() or None,
+    }
+    query = filter_users(
+        filters["role"], filters["year"], filters["division"], filters["q"]
     )
 
+    users, prev_id, next_id = user_page(
+        query,
+        after=request.args.get("after", type=int),
+        before=request.args.get("before", type=int),
+        per_page=per_page
+    )
+
+    # counting every match is the expensive part on big tables; opt in
+    show_count = request.args.get("count") == "1"
+
     return render_template(
         "admin_dashboard.html",
-        users=users_paginated.items,
-        pagination=users_paginated
+        users=users,
+        prev_id=prev_id,
+        next_id=next_id,
+        filters={k: v for k, v in filters.items() if v},
+        roles=ROLES,
+        total=count_users(query) if show_count else None
     )
 
+@web.route("/admin/cache-stats")
+@login_required
+def cache_stats():
+    if current_user.role != "admin":
+        return redirect("/")
+
+    return jsonify(report_cache.stats())
+
 # =========================
 # ADMIN ACTIONS (MISSING ROUTES)
 # =========================
 
 
-@app.route("/toggle_user/<int:user_id>")
+@web.route("/toggle_user/<int:user_id>")
 @login_required
 def toggle_user(user_id):
     if current_user.role != "admin":
@@ -334,7 +373,7 @@ def toggle_user(user_id):
     return redirect("/admin")
 
 
-@app.route("/delete_user/<int:user_id>")
+@web.route("/delete_user/<int:user_id>")
 @login_required
 def delete_user(user_id):
     if current_user.role != "admin":
@@ -347,6 +386,7 @@ def delete_user(user_id):
         return redirect("/admin")
 
     db.session.delete(user)
+    bump("users")
     db.session.commit()
     return redirect("/admin")
 
@@ -355,7 +395,7 @@ def delete_user(user_id):
 
 
 
-@app.route("/add_user", methods=["GET", "POST"])
+@web.route("/add_user", methods=["GET", "POST"])
 @login_required
 def add_user():
     if current_user.role != "admin":
@@ -370,7 +410,7 @@ def add_user():
 
         user = User(
             username=request.form["username"],
-            password=generate_password_hash(request.form["password"]),
+            password=passwords.hash(request.form["password"]),
             role=role,
             phone=request.form.get("phone"),
             year=request.form.get("year"),
@@ -379,38 +419,98 @@ def add_user():
         )
 
         db.session.add(user)
+        bump("users")
         db.session.commit()
         return redirect("/admin")
 
     return render_template(
         "add_user.html",
-        subjects=Subject.query.all()
+        subjects=subject_cache.all()
+    )
+
+@web.route("/import_users", methods=["GET", "POST"])
+@login_required
+def bulk_import():
+    """Take the CSV and import it in the background; hashing the passwords
+    of a large file takes longer than a request may."""
+    if current_user.role != "admin":
+        return redirect("/")
+
+    error = None
+
+    if request.method == "POST":
+        upload = request.files.get("file")
+        data = upload.stream.read(MAX_IMPORT_BYTES + 1) if upload and upload.filename else b""
+        if not data:
+            error = "Choose a CSV file to import"
+        elif len(data) > MAX_IMPORT_BYTES:
+            error = (f"The file is over {MAX_IMPORT_BYTES // 1024} KB; "
+                     "import it with `flask import-users` instead")
+        else:
+            key = start_import(current_app._get_current_object(), data)
+            return redirect(url_for("web.import_progress", key=key))
+
+    return render_template(
+        "import_users.html",
+        columns=IMPORT_COLUMNS,
+        status=None,
+        result=None,
+        error=error
+    )
+
+
+@web.route("/import_users/<key>")
+@login_required
+def import_progress(key):
+    """Status page of a background import; refreshes itself while pending."""
+    if current_user.role != "admin":
+        return redirect("/")
+
+    if not valid_import_key(key):
+        return redirect(url_for("web.bulk_import"))
+
+    status, result = import_status(current_app, key)
+    error = {
+        "failed": result and result.get("error"),
+        "missing": "This import is no longer available",
+    }.get(status)
+
+    return render_template(
+        "import_users.html",
+        columns=IMPORT_COLUMNS,
+        status=status,
+        result=result if status == "ready" else None,
+        error=error
     )
 
 # =========================
 # TEACHER
 # =========================
-@app.route("/teacher")
+@web.route("/teacher")
 @login_required
+@read_replica
 def teacher():
     if current_user.role != "teacher":
         return redirect("/")
 
-    today = date.today()
-    records = Attendance.query.filter_by(date=today).all()
+    # the rollup lookup costs no more than a cache check would
+    summary = daily_summary(date.today(), current_user.subject_id)
+    subject = subject_cache.get(current_user.subject_id)
 
     return render_template(
         "teacher_dashboard.html",
-        total_students=len(records),
-        present_count=sum(r.status == "Present" for r in records),
-        absent_count=sum(r.status == "Absent" for r in records)
+        subject=subject.name if subject else None,
+        total_students=summary["total"],
+        present_count=summary["present"],
+        absent_count=summary["absent"],
+        classes=summary["classes"]
     )
 
 # =========================
 # MARK ATTENDANCE (FIXED)
 # =========================
-@app.route("/mark-attendance")
-@app.route("/mark_attendance")
+@web.route("/mark-attendance")
+@web.route("/mark_attendance")
 @login_required
 def mark_attendance():
     if current_user.role != "teacher":
@@ -447,38 +547,84 @@ def mark_attendance():
     )
 
 
-@app.route("/mark_single", methods=["POST"])
+@web.route("/mark_single", methods=["POST"])
 @login_required
 def mark_single():
     if current_user.role != "teacher":
         return "", 403
 
-    student = request.form["student"]
-    status = request.form["status"].capitalize()
-    today = date.today()
-    subject_name = Subject.query.get(current_user.subject_id).name
+    student_id = request.form.get("student_id", type=int)
+    username = request.form.get("student")
+    status = normalize_status(request.form["status"])
+    if not status:
+        return "", 400
 
-    # ❌ prevent duplicate entry for same student + date + subject
-    existing = Attendance.query.filter_by(
-        student=student,
-        subject=subject_name,
-        date=today
-    ).first()
-
-    if existing:
-        existing.status = status
-    else:
-        attendance = Attendance(
-            student=student,
-            subject=subject_name,
-            status=status,
-            date=today
-        )
-        db.session.add(attendance)
+    ids, names = resolve_students(
+        [student_id] if student_id else [],
+        [username] if username else []
+    )
+    student_id = student_id if student_id in ids else names.get(username)
+    if student_id is None:
+        return "", 404
 
-    db.session.commit()
+    # one row per student + date + subject; a repeat mark overwrites it
+    record_marks(current_user.subject_id, date.today(), {student_id: status})
     return "", 200
 
+
+@web.route("/mark_bulk", methods=["POST"])
+@login_required
+def mark_bulk():
+    if current_user.role != "teacher":
+        return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+    data = request.get_json(silent=True) or {}
+    marks = data.get("marks", []) if isinstance(data, dict) else None
+
+    if not isinstance(marks, list) or not all(isinstance(m, dict) for m in marks):
+        return jsonify({"status": "error", "message": "marks must be a list of objects"}), 400
+    if len(marks) > MAX_BULK_MARKS:
+        return jsonify({
+            "status": "error",
+            "message": f"At most {MAX_BULK_MARKS} marks per request"
+        }), 400
+
+    for m in marks:
+        student = m.get("student_id") or m.get("student")
+        if not student or not isinstance(student, (int, str)) or isinstance(student, bool) \
+                or not normalize_status(m.get("status")):
+            return jsonify({
+                "status": "error",
+                "message": f"Invalid mark: {m}"
+            }), 400
+
+    # students may be given by id (the mark attendance page) or username
+    ids, names = resolve_students(
+        [m["student_id"] for m in marks if m.get("student_id")],
+        [m["student"] for m in marks if not m.get("student_id")]
+    )
+
+    statuses = {}
+    unknown = []
+    for m in marks:
+        student_id = m.get("student_id")
+        student_id = student_id if student_id in ids else names.get(m.get("student"))
+        if student_id is None:
+            unknown.append(m.get("student_id") or m.get("student"))
+        else:
+            statuses[student_id] = normalize_status(m["status"])
+
+    if unknown:
+        return jsonify({
+            "status": "error",
+            "message": "Unknown students",
+            "students": unknown
+        }), 400
+
+    saved = record_marks(current_user.subject_id, date.today(), statuses)
+
+    return jsonify({"status": "success", "saved": saved})
+
 # =========================
 # MONTHLY REPORT (ONLY ADD)
 # =========================
@@ -486,156 +632,226 @@ def mark_single():
 # =========================
 # CC
 # =========================
-@app.route("/cc")
+@web.route("/cc")
 @login_required
+@read_replica
+@versioned(lambda: ["attendance", "users", "subjects"] if current_user.role == "cc" else None)
 def cc():
     if current_user.role != "cc":
         return redirect("/")
 
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        flash("That academic year is not archived")
+        return redirect(url_for("web.cc"))
+
     return render_template(
         "cc_dashboard.html",
-        report=generate_cc_report()
+        report=cached_cc_report(academic_year),
+        academic_year=academic_year,
+        academic_years=archive_choices()
     )
-from flask import send_file
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import io
-
-def clean(v):
-    return "0" if v is None else str(v)
 
-from flask import session
 
-@app.route("/cc/report")
+@web.route("/cc/report")
 @login_required
+@read_replica
 def cc_report():
-    global CC_REPORT_CACHE
+    if current_user.role != "cc":
+        return redirect("/")
 
-    report_data = []
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        flash("That academic year is not archived")
+        return redirect(url_for("web.cc"))
 
-    # 🔥 PUT YOUR REAL WORKING LOGIC HERE 🔥
-    # (this example matches your screenshot)
+    return render_template(
+        "cc_dashboard.html",
+        report=cached_cc_report(academic_year),
+        academic_year=academic_year,
+        academic_years=archive_choices()
+    )
 
-    students = [
-        ("student1", 100.0, 100.0, None, None, None, 100.0),
-        ("student2", 100.0, 100.0, None, None, None, 100.0),
-        ("student3", 100.0, 100.0, None, None, None, 100.0),
-        ("student4", 100.0, 100.0, None, None, None, 100.0),
-        ("student5", 100.0, 100.0, None, None, None, 100.0),
-    ]
 
-    for s in students:
-        report_data.append({
-            "student": s[0],
-            "python": s[1],
-            "java": s[2],
-            "mic": s[3],
-            "es": s[4],
-            "dcn": s[5],
-            "total": s[6],
-        })
+@web.route("/cc/at_risk")
+@login_required
+@read_replica
+@versioned(lambda: ["attendance", "users", "subjects"] if current_user.role == "cc" else None)
+def cc_at_risk():
+    if current_user.role != "cc":
+        return redirect("/")
 
-    # 🔴 THIS LINE IS THE MOST IMPORTANT LINE 🔴
-    CC_REPORT_CACHE = report_data
+    filters = {
+        "year": request.args.get("year") or None,
+        "division": request.args.get("division") or None
+    }
+    # NumPy is only imported by the workers that serve this page
+    from analytics import THRESHOLD, cached_at_risk_report
 
-    print("CC_REPORT_CACHE SET:", CC_REPORT_CACHE)  # DEBUG
+    try:
+        report = cached_at_risk_report(
+            request.args.get("threshold", THRESHOLD, type=float), **filters
+        )
+    except ValueError:
+        flash("Threshold must be between 0 and 100")
+        return redirect("/cc")
 
-    return render_template(
-        "cc_report.html",
-        report_data=report_data
-    )
-@app.route("/cc/export-pdf")
+    return render_template("cc_at_risk.html", report=report, filters=filters)
+
+
+@web.route("/cc/export-pdf", methods=["GET", "POST"])
 @login_required
 def export_cc_pdf():
-    from flask import send_file
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.lib import colors
-    import io
-
-    report_data = get_cc_report_data()
-
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(
-        Paragraph("<b>Full Student Attendance Report</b>", styles["Title"])
-    )
-    elements.append(Paragraph("<br/>", styles["Normal"]))
-
-    table_data = [[
-        "Student", "Python", "Java", "MIC", "ES", "DCN", "Total %"
-    ]]
-
-    for r in report_data:
-        table_data.append([
-            r["student"],
-            r["python"] if r["python"] is not None else "—",
-            r["java"] if r["java"] is not None else "—",
-            r["mic"] if r["mic"] is not None else "—",
-            r["es"] if r["es"] is not None else "—",
-            r["dcn"] if r["dcn"] is not None else "—",
-            r["total"]
-        ])
-
-    table = Table(table_data, colWidths=[90, 60, 60, 60, 60, 60, 60])
-    table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
-    ]))
-
-    elements.append(table)
-    doc.build(elements)
-
-    buffer.seek(0)
+    """Serve the PDF if it is already built for the current data, otherwise
+    queue a background build and report where to poll for it. Takes the
+    ?academic_year= of an archived year, like /cc."""
+    if current_user.role != "cc":
+        return redirect("/")
+
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        return jsonify({"status": "error", "message": "Academic year not archived"}), 404
+
+    params = {"academic_year": academic_year} if academic_year is not None else None
+    key = report_key("cc", params)
+
+    if request.method == "GET" and job_status(current_app, key) == "ready":
+        return cc_pdf_download(key)
+
+    status = start_job(current_app._get_current_object(), "cc", key, params)
+
+    return jsonify({
+        "status": status,
+        "key": key,
+        "status_url": url_for("web.cc_pdf_status", key=key),
+        "download_url": url_for("web.cc_pdf_download", key=key)
+    }), 200 if status == "ready" else 202
+
+
+@web.route("/cc/export-pdf/<key>/status")
+@login_required
+def cc_pdf_status(key):
+    if current_user.role != "cc":
+        return redirect("/")
+
+    if not valid_key(key):
+        return jsonify({"status": "error", "message": "Unknown report"}), 404
+
+    return jsonify({
+        "status": job_status(current_app, key),
+        "key": key,
+        "status_url": url_for("web.cc_pdf_status", key=key),
+        "download_url": url_for("web.cc_pdf_download", key=key)
+    })
+
+
+@web.route("/cc/export-pdf/<key>")
+@login_required
+def cc_pdf_download(key):
+    if current_user.role != "cc":
+        return redirect("/")
+
+    if not valid_key(key) or job_status(current_app, key) != "ready":
+        return jsonify({"status": "error", "message": "Report not ready"}), 404
+
     return send_file(
-        buffer,
+        artifact_path(current_app, key),
         as_attachment=True,
         download_name="attendance_report.pdf",
         mimetype="application/pdf"
     )
 
 
+@web.route("/export/attendance")
+@login_required
+@read_replica
+def export_attendance():
+    """Raw attendance rows streamed as CSV for the data warehouse.
+
+    Filters: ?from=&to= ISO dates, year, division, subject_id;
+    ?format=csv.gz compresses the stream.
+    """
+    if current_user.role not in ("admin", "cc"):
+        return redirect("/")
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": "Unknown format"}), 400
+
+    try:
+        start = request.args.get("from")
+        end = request.args.get("to")
+        rows = iter_attendance(
+            date.fromisoformat(start) if start else None,
+            date.fromisoformat(end) if end else None,
+            request.args.get("year"),
+            request.args.get("division"),
+            request.args.get("subject_id", type=int)
+        )
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid date"}), 400
+
+    return Response(
+        stream_with_context(stream_csv(rows, compress=fmt == "csv.gz")),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=attendance.{fmt}"}
+    )
 
 
 # =========================
 # STUDENT
 # =========================
-@app.route("/student")
+@web.route("/student")
 @login_required
+@versioned(lambda: [student_version_key(current_user.id), "subjects"]
+           if current_user.role == "student" else None)
 def student():
     if current_user.role != "student":
         return redirect("/")
 
+    try:
+        academic_year = archives.requested(request.args.get("academic_year"))
+    except ValueError:
+        flash("That academic year is not archived")
+        return redirect(url_for("web.student"))
+
+    if academic_year is not None:
+        overall, _, records = archives.student_year(academic_year, current_user.id)
+        return render_template(
+            "student_dashboard.html",
+            records=records,
+            present_count=overall["present"],
+            absent_count=overall["absent"],
+            streak=None,
+            academic_year=academic_year,
+            academic_years=archive_choices()
+        )
+
     records = Attendance.query.filter_by(
-        student=current_user.username
+        student_id=current_user.id
     ).order_by(Attendance.date.desc()).all()
 
-    streak = 0
-    for r in records:
-        if r.status == "Present":
-            streak += 1
-        else:
-            break
+    summary = get_summary(current_user.id)
 
     return render_template(
         "student_dashboard.html",
         records=records,
-        present_count=sum(r.status == "Present" for r in records),
-        absent_count=sum(r.status == "Absent" for r in records),
-        streak=streak
+        present_count=summary.present,
+        absent_count=summary.absent,
+        streak=summary.streak,
+        academic_years=archive_choices()
     )
 
 # =========================
 # MONTHLY REPORT (TEACHER)
 # =========================
-@app.route("/monthly_chart")
+@web.route("/monthly_chart")
 @login_required
+@read_replica
+@versioned(monthly_chart_versions, monthly_chart_inputs)
 def monthly_chart():
     if current_user.role != "teacher":
         return redirect("/")
@@ -647,49 +863,31 @@ def monthly_chart():
         flash("Please select year and division")
         return redirect("/teacher")
 
-    subject_name = Subject.query.get(current_user.subject_id).name
-
-    students = User.query.filter_by(
-        role="student",
-        year=year,
-        division=division
-    ).all()
-
-    report = []
-    total_percent = 0
-    count = 0
-
-    for s in students:
-        records = Attendance.query.filter_by(
-            student=s.username,
-            subject=subject_name
-        ).order_by(Attendance.date).all()
-
-        present = sum(r.status == "Present" for r in records)
-        absent = sum(r.status == "Absent" for r in records)
-        total = len(records)
-        percent = round((present / total) * 100, 2) if total else 0
-
-        if total:
-            total_percent += percent
-            count += 1
+    try:
+        start, end = report_range(request.args)
+    except (KeyError, ValueError):
+        flash("Please select a valid month or date range")
+        return redirect("/teacher")
 
-        report.append({
-            "student": s.username,
-            "present": present,
-            "absent": absent,
-            "total": total,
-            "percentage": percent,
-            "records": records
-        })
+    subject = subject_cache.get(current_user.subject_id)
 
-    class_average = round(total_percent / count, 2) if count else 0
+    report, class_average = report_cache.cached(
+        "monthly_chart",
+        {
+            "subject": subject.id, "year": year, "division": division,
+            "start": start, "end": end
+        },
+        ("attendance", "users"),
+        lambda: monthly_report(subject.id, year, division, start, end)
+    )
 
     return render_template(
         "monthly_chart.html",
         report=report,
-        subject=subject_name,
-        class_average=class_average
+        subject=subject.name,
+        class_average=class_average,
+        start=start,
+        end=end
     )
 
 
@@ -697,4 +895,4 @@ def monthly_chart():
 # RUN
 # =========================
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,401 @@
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import (
+    Boolean, Column, Date, Index, Integer, MetaData, String, Table,
+    case, create_engine, delete, func, insert, literal, select, tuple_
+)
+
+from models import db, Attendance, Subject, User, ALL_SUBJECTS, status_label
+from summaries import rebuild_summaries
+from versions import bump, class_version_key, student_version_key
+
+ARCHIVE_BATCH = 10000
+
+# =========================
+# ARCHIVE SCHEMA
+# =========================
+# One SQLite file per closed academic year. Students and subjects are
+# copied as they were when the year was archived, so renames, class
+# changes and deletions later on do not rewrite history.
+metadata = MetaData()
+
+students = Table(
+    "student", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(80), nullable=False),
+    Column("year", String(10)),
+    Column("division", String(5)),
+)
+
+subjects = Table(
+    "subject", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(50), nullable=False),
+)
+
+attendance = Table(
+    "attendance", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("student_id", Integer, nullable=False),
+    Column("subject_id", Integer, nullable=False),
+    Column("present", Boolean, nullable=False),
+    Column("date", Date, nullable=False),
+    Index("ix_archive_student_date", "student_id", "date"),
+    Index("ix_archive_date", "date"),
+)
+
+# counters for the whole year; subject_id == ALL_SUBJECTS is the overall row
+summary = Table(
+    "summary", metadata,
+    Column("student_id", Integer, primary_key=True),
+    Column("subject_id", Integer, primary_key=True),
+    Column("present", Integer, nullable=False),
+    Column("absent", Integer, nullable=False),
+    Column("total", Integer, nullable=False),
+)
+
+
+class Archives:
+    """Closed academic years, moved out of the attendance table.
+
+    `flask --app app archive-years` copies every closed year's marks into
+    its own file, with the per-student counters precomputed, and deletes
+    them from the live table, so the live table and its summaries only
+    cover the years still open. Views read the archives only when asked
+    for an archived year (?academic_year=2024) or when paging past the
+    live rows.
+
+    Config: ARCHIVE_DIR (default instance/archive) and
+    ACADEMIC_YEAR_START_MONTH (default 6, June).
+    """
+
+    FILENAME = re.compile(r"^attendance-(\d{4})\.db$")
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.start_month = 6
+        self._engines = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.setdefault(
+            "ARCHIVE_DIR",
+            os.environ.get("ARCHIVE_DIR") or os.path.join(app.instance_path, "archive")
+        )
+        self.start_month = app.config.setdefault(
+            "ACADEMIC_YEAR_START_MONTH",
+            int(os.environ.get("ACADEMIC_YEAR_START_MONTH", 6))
+        )
+        app.extensions["archives"] = self
+
+    # ---------- academic years ----------
+    def year_of(self, day):
+        """The academic year `day` falls in, named by the year it starts."""
+        return day.year if day.month >= self.start_month else day.year - 1
+
+    def bounds(self, academic_year):
+        """First and last day of an academic year."""
+        start = date(academic_year, self.start_month, 1)
+        return start, date(academic_year + 1, self.start_month, 1) - timedelta(days=1)
+
+    def path(self, academic_year):
+        return os.path.join(self.directory, f"attendance-{academic_year}.db")
+
+    def years(self):
+        """Archived academic years, oldest first."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            int(m.group(1)) for m in map(self.FILENAME.match, os.listdir(self.directory)) if m
+        )
+
+    def requested(self, value):
+        """The archived year named by a ?academic_year= value, or None for
+        the live data when it is blank. Raises ValueError for a year that
+        is not archived."""
+        if not value:
+            return None
+        academic_year = int(value)
+        if academic_year not in self.years():
+            raise ValueError(f"{year_label(academic_year)} is not archived")
+        return academic_year
+
+    def engine(self, academic_year, create=False):
+        """Engine for one archive file; ValueError if it does not exist,
+        unless `create`."""
+        path = self.path(academic_year)
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is None:
+                if not create and not os.path.exists(path):
+                    raise ValueError(f"{year_label(academic_year)} is not archived")
+                os.makedirs(self.directory, exist_ok=True)
+                engine = self._engines[path] = create_engine("sqlite:///" + path)
+            return engine
+
+    # ---------- archiving ----------
+    def archive_closed_years(self):
+        """Archive every closed academic year, oldest first, rebuilding the
+        summaries once at the end. Returns archive_year's result for each."""
+        results = [self.archive_year(y, rebuild=False) for y in self.closed_years()]
+        if any(r["rows"] for r in results):
+            rebuild_summaries()
+        return results
+
+    def closed_years(self):
+        """Academic years that still have live marks and have ended."""
+        first = db.session.query(func.min(Attendance.date)).scalar()
+        if first is None:
+            return []
+        return list(range(self.year_of(first), self.year_of(date.today())))
+
+    def archive_year(self, academic_year, batch=ARCHIVE_BATCH, rebuild=True):
+        """Move one closed academic year's marks into its archive file.
+
+        The archive is written and committed first and the live rows are
+        deleted afterwards, so an interrupted run can simply be repeated;
+        marks added to an archived year later are merged in the same way.
+        Years must be archived oldest first. Pass rebuild=False when
+        archiving several years and call rebuild_summaries() after the
+        last. Returns a dict describing what was moved.
+        """
+        if academic_year >= self.year_of(date.today()):
+            raise ValueError(f"{year_label(academic_year)} has not ended yet")
+
+        start, end = self.bounds(academic_year)
+        in_year = Attendance.date.between(start, end)
+        if db.session.query(Attendance.id).filter(Attendance.date < start).first():
+            raise ValueError("Archive the earlier academic years first")
+
+        if not db.session.query(Attendance.id).filter(in_year).first():
+            return {"academic_year": academic_year, "rows": 0, "path": None}
+
+        engine = self.engine(academic_year, create=True)
+        metadata.create_all(engine)
+
+        moved = 0
+        with engine.begin() as archive:
+            roster = [
+                row._asdict() for row in db.session.query(
+                    User.id, User.username, User.year, User.division
+                ).filter(User.id.in_(
+                    db.session.query(Attendance.student_id).filter(in_year)
+                ))
+            ]
+            if roster:
+                archive.execute(insert(students).prefix_with("OR IGNORE"), roster)
+            archive.execute(insert(subjects).prefix_with("OR REPLACE"), [
+                row._asdict() for row in db.session.query(Subject.id, Subject.name)
+            ])
+
+            # keyset over ids, so memory stays at one batch; plain tuples
+            # straight to the driver, as building a dict per row costs more
+            # than the copy itself
+            page = select(
+                Attendance.id, Attendance.student_id, Attendance.subject_id,
+                Attendance.present, Attendance.date
+            ).where(in_year).order_by(Attendance.id).limit(batch)
+            after = 0
+            while True:
+                rows = db.session.connection().execute(
+                    page.where(Attendance.id > after)
+                ).all()
+                if not rows:
+                    break
+                archive.exec_driver_sql(
+                    "INSERT OR REPLACE INTO attendance VALUES (?, ?, ?, ?, ?)",
+                    [(i, s, sub, present, day.isoformat()) for i, s, sub, present, day in rows]
+                )
+                moved += len(rows)
+                after = rows[-1].id
+
+            _summarize(archive)
+
+        affected = db.session.query(Attendance.student_id).filter(in_year).distinct()
+        classes = db.session.query(User.year, User.division).filter(
+            User.id.in_(affected)
+        ).distinct().all()
+        student_keys = [student_version_key(s) for (s,) in affected]
+
+        db.session.execute(
+            delete(Attendance).where(in_year),
+            execution_options={"synchronize_session": False}
+        )
+        bump(
+            "attendance", "archive", *student_keys,
+            *(class_version_key(*c) for c in classes)
+        )
+        if rebuild:
+            # rebuilt from the remaining live rows; commits everything above
+            rebuild_summaries()
+        else:
+            db.session.commit()
+
+        return {"academic_year": academic_year, "rows": moved, "path": self.path(academic_year)}
+
+    # ---------- read-through ----------
+    def history_rows(self, student_id, before=None, limit=50):
+        """A student's archived marks, newest first, below the (date, id)
+        keyset `before`: rows with id, date, present and subject."""
+        found = []
+        for academic_year in reversed(self.years()):
+            if before and before[0] < self.bounds(academic_year)[0]:
+                continue
+            query = (
+                select(attendance.c.id, attendance.c.date, attendance.c.present,
+                       subjects.c.name.label("subject"))
+                .join(subjects, subjects.c.id == attendance.c.subject_id)
+                .where(attendance.c.student_id == student_id)
+                .order_by(attendance.c.date.desc(), attendance.c.id.desc())
+                .limit(limit - len(found))
+            )
+            if before:
+                query = query.where(tuple_(attendance.c.date, attendance.c.id) < before)
+            with self.engine(academic_year).connect() as conn:
+                found += conn.execute(query).all()
+            if len(found) >= limit:
+                break
+        return found
+
+    def iter_attendance(self, start=None, end=None, year=None, division=None,
+                        subject_id=None, batch=ARCHIVE_BATCH):
+        """Archived rows in exports.EXPORT_COLUMNS order, oldest first;
+        year and division are the student's class at the time."""
+        query = (
+            select(
+                attendance.c.id, attendance.c.date, attendance.c.student_id,
+                students.c.username, students.c.year, students.c.division,
+                attendance.c.subject_id, subjects.c.name, attendance.c.present
+            )
+            .join(students, students.c.id == attendance.c.student_id)
+            .join(subjects, subjects.c.id == attendance.c.subject_id)
+            .order_by(attendance.c.date, attendance.c.id)
+            .limit(batch)
+        )
+        if start:
+            query = query.where(attendance.c.date >= start)
+        if end:
+            query = query.where(attendance.c.date <= end)
+        if year:
+            query = query.where(students.c.year == year)
+        if division:
+            query = query.where(students.c.division == division)
+        if subject_id:
+            query = query.where(attendance.c.subject_id == subject_id)
+
+        for academic_year in self.years():
+            first, last = self.bounds(academic_year)
+            if (start and last < start) or (end and first > end):
+                continue
+            after = None
+            while True:
+                page = query
+                if after:
+                    page = page.where(tuple_(attendance.c.date, attendance.c.id) > after)
+                with self.engine(academic_year).connect() as conn:
+                    rows = conn.execute(page).all()
+                for row in rows:
+                    yield (*row[:-1], status_label(row.present))
+                if len(rows) < batch:
+                    break
+                after = (rows[-1].date, rows[-1].id)
+
+    def student_year(self, academic_year, student_id):
+        """(overall counters, [(subject, counters)], records newest first) for
+        one student's archived year; counters are dicts of present, absent
+        and total."""
+        with self.engine(academic_year).connect() as conn:
+            counters = conn.execute(
+                select(subjects.c.name, summary.c.subject_id, summary.c.present,
+                       summary.c.absent, summary.c.total)
+                .outerjoin(subjects, subjects.c.id == summary.c.subject_id)
+                .where(summary.c.student_id == student_id)
+                .order_by(summary.c.subject_id)
+            ).all()
+            records = conn.execute(
+                select(attendance.c.date, attendance.c.present,
+                       subjects.c.name.label("subject"))
+                .join(subjects, subjects.c.id == attendance.c.subject_id)
+                .where(attendance.c.student_id == student_id)
+                .order_by(attendance.c.date.desc(), attendance.c.id.desc())
+            ).all()
+
+        overall = {"present": 0, "absent": 0, "total": 0}
+        per_subject = []
+        for name, subject_id, present, absent, total in counters:
+            counts = {"present": present, "absent": absent, "total": total}
+            if subject_id == ALL_SUBJECTS:
+                overall = counts
+            else:
+                per_subject.append((name, counts))
+
+        return overall, per_subject, [
+            {"date": r.date, "subject": r.subject, "status": status_label(r.present)}
+            for r in records
+        ]
+
+    def cc_report_data(self, academic_year):
+        """reports.cc_report_data for an archived year, from its summaries."""
+        with self.engine(academic_year).connect() as conn:
+            names = conn.execute(
+                select(subjects.c.id, subjects.c.name).order_by(subjects.c.id)
+            ).all()
+            roster = conn.execute(
+                select(students.c.id, students.c.username).order_by(students.c.id)
+            ).all()
+            counts = {
+                (s, sub): (present, total) for s, sub, present, total in conn.execute(
+                    select(summary.c.student_id, summary.c.subject_id,
+                           summary.c.present, summary.c.total)
+                    .where(summary.c.subject_id != ALL_SUBJECTS)
+                )
+            }
+
+        rows = []
+        for student_id, username in roster:
+            per_subject = {
+                name: counts.get((student_id, subject_id), (0, 0))
+                for subject_id, name in names
+            }
+            rows.append({
+                "student": username,
+                "subjects": per_subject,
+                "present": sum(p for p, _ in per_subject.values()),
+                "total": sum(t for _, t in per_subject.values())
+            })
+
+        return [name for _, name in names], rows
+
+
+def _summarize(archive):
+    """Refill an archive's summary table from its attendance rows."""
+    present = attendance.c.present.is_(True)
+    counters = (
+        func.sum(case((present, 1), else_=0)),
+        func.sum(case((present, 0), else_=1)),
+        func.count(),
+    )
+    columns = ["student_id", "subject_id", "present", "absent", "total"]
+
+    archive.execute(delete(summary))
+    archive.execute(insert(summary).from_select(columns, (
+        select(attendance.c.student_id, attendance.c.subject_id, *counters)
+        .group_by(attendance.c.student_id, attendance.c.subject_id)
+    )))
+    archive.execute(insert(summary).from_select(columns, (
+        select(attendance.c.student_id, literal(ALL_SUBJECTS), *counters)
+        .group_by(attendance.c.student_id)
+    )))
+
+
+def year_label(academic_year):
+    """2024 -> "2024-25"."""
+    return f"{academic_year}-{(academic_year + 1) % 100:02d}"
+
+
+archives = Archives()
@@ -0,0 +1,74 @@
+"""Deep-page latency of the admin user list: OFFSET + COUNT(*) pagination
+versus keyset pages from users.py.
+
+    python benchmarks/bench_admin_users.py --users 200000
+"""
+import argparse
+import os
+import time
+
+from common import make_app, seed
+
+from models import User
+from users import count_users, filter_users, user_page
+
+PER_PAGE = 10
+
+
+def offset_page(page, **filters):
+    query = User.query
+    for column, value in filters.items():
+        query = query.filter(getattr(User, column) == value)
+    return query.order_by(User.id).paginate(
+        page=page, per_page=PER_PAGE, error_out=False
+    ).items
+
+
+def keyset_page(after, **filters):
+    return user_page(filter_users(**filters), after=after, per_page=PER_PAGE)[0]
+
+
+def ms(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.users, 0)
+
+        filtered = {"role": "student", "year": "SY", "division": "B"}
+        matches = count_users(filter_users(**filtered))
+
+        print(f"{'list':>9} {'page':>7} {'offset ms':>10} {'keyset ms':>10}")
+        for label, filters, size in (
+            ("all", {}, args.users),
+            ("SY-B", filtered, matches),
+        ):
+            pages = max(1, size // PER_PAGE)
+            for page in sorted({1, pages // 2, pages}):
+                off_ms, off_rows = ms(lambda: offset_page(page, **filters), args.repeat)
+
+                # the keyset link for that page carries the last id before it
+                after = off_rows[0].id - 1 if off_rows else None
+                key_ms, key_rows = ms(lambda: keyset_page(after, **filters), args.repeat)
+
+                assert [u.id for u in off_rows] == [u.id for u in key_rows]
+                print(f"{label:>9} {page:>7} {off_ms:>10.2f} {key_ms:>10.2f}")
+
+        count_ms, _ = ms(lambda: count_users(filter_users()), args.repeat)
+        print(f"exact count of all users: {count_ms:.2f} ms (skipped unless ?count=1)")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
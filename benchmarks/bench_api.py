@@ -0,0 +1,192 @@
+"""Hundreds of concurrent mobile clients against api_app under gunicorn:
+sync workers (the web app's deployment) versus gthread workers with the
+per-endpoint concurrency limits.
+
+    python benchmarks/bench_api.py --clients 300 --seconds 15
+
+Every client loops over the dashboard, with one in `--cc-share` calls
+being the CC report; the report cache is disabled so every report call
+is slow.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from common import ROOT, make_app, percentile, seed
+
+from models import db, User
+
+SECRET = "bench-secret-" + "0" * 32
+
+MODES = {
+    "sync": ["--workers", "2"],
+    "gthread": ["--workers", "2", "--worker-class", "gthread", "--threads", "32"],
+}
+
+
+def tokens():
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = SECRET
+    JWTManager(app)
+    with app.app_context():
+        return {
+            role: create_access_token(identity={"username": name, "role": role})
+            for role, name in (("student", "student0"), ("cc", "bench_cc"))
+        }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, path, port, limits):
+    env = dict(
+        os.environ,
+        DATABASE_URL="sqlite:///" + path,
+        DB_PROFILE="production",
+        JWT_SECRET_KEY=SECRET,
+        REPORT_CACHE_SIZE="0",
+        API_CONCURRENCY=limits,
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "api_app:app",
+         "--bind", f"127.0.0.1:{port}", "--backlog", "2048", *MODES[mode]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"gunicorn ({mode}) did not start")
+
+
+def client(port, tokens, cc_share, deadline, results, lock):
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        name, role = (
+            ("cc_report", "cc") if n % cc_share == 0 else ("dashboard", "student")
+        )
+        path = "/api/cc/report" if name == "cc_report" else "/api/student/dashboard"
+        req = urllib.request.Request(
+            f"http://127.0.0.1:{port}{path}",
+            headers={"Authorization": f"Bearer {tokens[role]}"}
+        )
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = "error"
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            results[name].append((elapsed, status))
+
+
+def run(mode, path, args, limits):
+    port = free_port()
+    server = start_server(mode, path, port, limits)
+    try:
+        results = defaultdict(list)
+        lock = threading.Lock()
+        minted = tokens()
+        deadline = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(
+                target=client,
+                args=(port, minted, args.cc_share, deadline, results, lock)
+            )
+            for _ in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    summary = {}
+    for name, samples in sorted(results.items()):
+        ok = sorted(s for s, status in samples if status == 200)
+        summary[name] = {
+            "requests": len(samples),
+            "ok": len(ok),
+            "busy_503": sum(1 for _, status in samples if status == 503),
+            "failed": sum(1 for _, status in samples if status not in (200, 503)),
+            "p50_ms": round((percentile(ok, 50) or 0) * 1000, 1),
+            "p95_ms": round((percentile(ok, 95) or 0) * 1000, 1),
+            "p99_ms": round((percentile(ok, 99) or 0) * 1000, 1),
+        }
+    total_ok = sum(r["ok"] for r in summary.values())
+    return {"ok_per_sec": round(total_ok / elapsed, 1), "endpoints": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--seconds", type=int, default=15)
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=20)
+    parser.add_argument("--cc-share", type=int, default=10,
+                        help="every Nth call of a client is the CC report")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.students, args.days)
+        db.session.add(User(username="bench_cc", password="x", role="cc"))
+        db.session.commit()
+    path = app.config["BENCH_DB_PATH"]
+
+    results = {}
+    try:
+        for mode, limits in (
+            ("sync", "api_cc.cc_report=0,*=0"),
+            ("gthread", ""),
+        ):
+            results[mode] = run(mode, path, args, limits)
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    print(f"{'mode':>8} {'endpoint':>10} {'requests':>9} {'503':>5} {'failed':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode, result in results.items():
+        for name, r in result["endpoints"].items():
+            print(f"{mode:>8} {name:>10} {r['requests']:>9} {r['busy_503']:>5} "
+                  f"{r['failed']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+        print(f"{mode:>8} {result['ok_per_sec']} successful requests/s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Academic-year archiving: reads of the current year before and after the
+closed years are moved out of the attendance table, and what it costs to
+read an archived year back.
+
+    python benchmarks/bench_archive.py --students 300 --days 900
+
+Times the student dashboard's full record load, a month of the teacher
+report, a summary rebuild and a deep history page, each best of --runs.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+
+from common import make_app, seed
+
+from archive import archives
+from history import history_page
+from models import db, Attendance, User
+from reports import monthly_report
+from summaries import rebuild_summaries
+
+
+def best(fn, runs):
+    fastest = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        fastest = min(fastest, time.perf_counter() - started)
+    return fastest
+
+
+def live_reads(student_id, runs):
+    today = date.today()
+    month = date(today.year, today.month, 1)
+    return {
+        "student records": best(lambda: Attendance.query.filter_by(
+            student_id=student_id
+        ).order_by(Attendance.date.desc()).all(), runs),
+        "monthly report": best(lambda: monthly_report(1, "FY", "A", month, today), runs),
+        "rebuild summaries": best(rebuild_summaries, runs),
+        "history page 1": best(lambda: history_page(student_id, None, 50), runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--days", type=int, default=900)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = make_app()
+    app.config["ARCHIVE_DIR"] = directory
+    archives.init_app(app)
+
+    with app.app_context():
+        seed(args.students, args.days)
+        student_id = db.session.query(User.id).filter_by(role="student").first()[0]
+        total = Attendance.query.count()
+
+        before = live_reads(student_id, args.runs)
+
+        started = time.perf_counter()
+        archives.archive_closed_years()
+        archiving = time.perf_counter() - started
+        live = Attendance.query.count()
+
+        after = live_reads(student_id, args.runs)
+        archived = {
+            "archived year, student": best(
+                lambda: archives.student_year(archives.years()[-1], student_id), args.runs
+            ),
+            "archived year, CC": best(
+                lambda: archives.cc_report_data(archives.years()[-1]), args.runs
+            ),
+        }
+
+    print(f"{total} marks, {live} left live after archiving "
+          f"{archives.years()} in {archiving:.2f}s\n")
+    print(f"{'read':>24} {'before':>8} {'after':>8}")
+    for name in before:
+        print(f"{name:>24} {before[name]:>8.4f} {after[name]:>8.4f}")
+    for name, seconds in archived.items():
+        print(f"{name:>24} {'':>8} {seconds:>8.4f}")
+
+    shutil.rmtree(directory)
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""The at-risk report: analytics.at_risk_report (NumPy matrices) versus the
+same report built with per-row loops in the style of generate_cc_report.
+
+    python benchmarks/bench_at_risk.py --students 50000
+
+Only the summaries are read, so they are seeded directly with random
+counts instead of from attendance rows. Both versions must agree.
+"""
+import argparse
+import math
+import os
+import random
+import time
+from bisect import bisect_right
+
+from sqlalchemy import insert
+
+from common import make_app, seed
+
+from analytics import THRESHOLD, at_risk_report
+from models import db, AttendanceSummary, Subject, User
+from reports import attendance_counts
+
+
+def seed_summaries(classes_held):
+    rnd = random.Random(7)
+    student_ids = [i for (i,) in db.session.query(User.id).filter_by(role="student")]
+    subject_ids = [i for (i,) in db.session.query(Subject.id)]
+    rows = []
+    for student in student_ids:
+        for subject in subject_ids:
+            total = rnd.randint(classes_held // 2, classes_held)
+            present = round(total * rnd.betavariate(12, 2))
+            rows.append({
+                "student_id": student, "subject_id": subject,
+                "present": present, "absent": total - present,
+                "total": total, "streak": 0
+            })
+    for i in range(0, len(rows), 50000):
+        db.session.execute(insert(AttendanceSummary), rows[i:i + 50000])
+    db.session.commit()
+
+
+def loop_report(threshold=THRESHOLD):
+    """at_risk_report written the way reports.py loops over rows."""
+    subjects = db.session.query(Subject.id, Subject.name).order_by(Subject.id).all()
+    students = (
+        db.session.query(User.id, User.username, User.year, User.division)
+        .filter_by(role="student").order_by(User.id).all()
+    )
+    counts = attendance_counts()
+
+    def pct(present, total):
+        return present * 100.0 / total if total else None
+
+    def needed(present, total):
+        return max(math.ceil((threshold * total - 100.0 * present) / (100.0 - threshold) - 1e-9), 0)
+
+    rows, by_class, everyone = [], {}, []
+    at_risk_per_subject = {name: 0 for _, name in subjects}
+    for student_id, username, year, division in students:
+        row = {"student": username, "year": year or "", "division": division or "",
+               "present": 0, "total": 0, "subjects": []}
+        for subject_id, name in subjects:
+            present, total = counts.get((student_id, subject_id), (0, 0))
+            row["present"] += present
+            row["total"] += total
+            p = pct(present, total)
+            if p is not None and p < threshold:
+                at_risk_per_subject[name] += 1
+                row["subjects"].append({
+                    "subject": name, "present": present, "total": total,
+                    "percentage": round(p, 2), "needed": needed(present, total)
+                })
+        row["overall"] = pct(row["present"], row["total"])
+        if row["overall"] is not None:
+            by_class.setdefault((row["year"], row["division"]), []).append(row["overall"])
+            everyone.append(row["overall"])
+        rows.append(row)
+
+    for scores in by_class.values():
+        scores.sort(reverse=True)
+    everyone.sort()
+
+    report = []
+    for row in rows:
+        overall = row["overall"]
+        if not row["subjects"] and not (overall is not None and overall < threshold):
+            continue
+        scores = by_class[(row["year"], row["division"])]
+        report.append({
+            "student": row["student"],
+            "year": row["year"],
+            "division": row["division"],
+            "present": row["present"],
+            "total": row["total"],
+            "percentage": round(overall, 2),
+            "needed": needed(row["present"], row["total"]),
+            "class_rank": scores.index(overall) + 1,
+            "class_size": len(scores),
+            "percentile": round(bisect_right(everyone, overall) * 100.0 / len(everyone), 2),
+            "subjects": row["subjects"]
+        })
+    report.sort(key=lambda r: r["percentage"])
+    return report, at_risk_per_subject
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=50000)
+    parser.add_argument("--classes", type=int, default=60,
+                        help="classes held per subject so far")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.students, 0)
+        seed_summaries(args.classes)
+
+        timings = {}
+        for name, build in (("loops", loop_report), ("numpy", at_risk_report)):
+            best = float("inf")
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                result = build()
+                best = min(best, time.perf_counter() - started)
+            timings[name] = (best, result)
+
+        loops, at_risk_per_subject = timings["loops"][1]
+        vectorized = timings["numpy"][1]
+        assert vectorized["at_risk_per_subject"] == at_risk_per_subject
+        # the order of equal percentages may differ
+        key = lambda r: (r["percentage"], r["student"])
+        assert sorted(vectorized["students"], key=key) == sorted(loops, key=key)
+
+    print(f"{len(loops)} of {args.students} students below {THRESHOLD}%")
+    print(f"{'impl':>6} {'seconds':>8}")
+    for name, (best, _) in timings.items():
+        print(f"{name:>6} {best:>8.3f}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""The attendance bitmaps (bitmaps.py) versus the row-based queries they
+replace: streak recompute, a month of the teacher report, a month heatmap
+and a percentage over a window. Both paths must agree.
+
+    python benchmarks/bench_bitmaps.py --students 900 --days 400
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import case, func
+
+from common import make_app, seed
+
+import bitmaps
+from models import db, Attendance, User, ALL_SUBJECTS, status_label
+from reports import monthly_report
+
+
+# =========================
+# ROW-BASED VERSIONS
+# =========================
+def rows_streak(student_id, subject_id=ALL_SUBJECTS):
+    """summaries._recompute_streak as it was before the bitmaps."""
+    filters = [Attendance.student_id == student_id]
+    if subject_id != ALL_SUBJECTS:
+        filters.append(Attendance.subject_id == subject_id)
+    last_absent, last_date = db.session.query(
+        func.max(case((Attendance.present.is_(False), Attendance.date))),
+        func.max(Attendance.date)
+    ).filter(*filters).one()
+    if last_absent is not None:
+        filters.append(Attendance.date > last_absent)
+    count = db.session.query(func.count(Attendance.id)).filter(
+        *filters, Attendance.present.is_(True)
+    ).scalar()
+    return count, last_date, last_absent
+
+
+def rows_monthly_report(subject_id, year, division, start, end):
+    """reports.monthly_report as it was before the bitmaps."""
+    students = (
+        db.session.query(User.id, User.username)
+        .filter_by(role="student", year=year, division=division)
+        .order_by(User.id).all()
+    )
+    in_range = (
+        Attendance.student_id.in_(
+            db.session.query(User.id)
+            .filter_by(role="student", year=year, division=division)
+            .scalar_subquery()
+        ),
+        Attendance.subject_id == subject_id,
+        Attendance.date.between(start, end),
+    )
+    counts = {
+        s: (present or 0, total) for s, present, total in db.session.query(
+            Attendance.student_id,
+            func.sum(case((Attendance.present.is_(True), 1), else_=0)),
+            func.count(Attendance.id)
+        ).filter(*in_range).group_by(Attendance.student_id)
+    }
+    records = {}
+    for s, day, present in (
+        db.session.query(Attendance.student_id, Attendance.date, Attendance.present)
+        .filter(*in_range).order_by(Attendance.student_id, Attendance.date)
+    ):
+        records.setdefault(s, []).append({"date": day, "status": status_label(present)})
+
+    report, total_percent, count = [], 0, 0
+    for s, username in students:
+        present, total = counts.get(s, (0, 0))
+        percent = round((present / total) * 100, 2) if total else 0
+        if total:
+            total_percent += percent
+            count += 1
+        report.append({
+            "student": username, "present": present, "absent": total - present,
+            "total": total, "percentage": percent, "records": records.get(s, [])
+        })
+    return report, round(total_percent / count, 2) if count else 0
+
+
+def rows_day_grid(student_id, start, end):
+    grid = {}
+    for day, present in (
+        db.session.query(Attendance.date, Attendance.present)
+        .filter(Attendance.student_id == student_id, Attendance.date.between(start, end))
+        .order_by(Attendance.date)
+    ):
+        counts = grid.setdefault(day, [0, 0])
+        counts[0 if present else 1] += 1
+    return {day: tuple(c) for day, c in grid.items()}
+
+
+def rows_window_percentage(student_id, start, end):
+    present, total = db.session.query(
+        func.sum(case((Attendance.present.is_(True), 1), else_=0)),
+        func.count(Attendance.id)
+    ).filter(Attendance.student_id == student_id, Attendance.date.between(start, end)).one()
+    present = present or 0
+    return present, total, round(present * 100 / total, 2) if total else None
+
+
+def best(fn, runs):
+    fastest, result = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        fastest = min(fastest, time.perf_counter() - started)
+    return fastest, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=900)
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.students, args.days)
+        student_ids = [
+            s for (s,) in db.session.query(User.id).filter_by(role="student").order_by(User.id)
+        ][:50]
+        today = date.today()
+        month = date(today.year, today.month, 1) - timedelta(days=31)
+        month = (month.replace(day=1), date(today.year, today.month, 1) - timedelta(days=1))
+        window = (today - timedelta(days=120), today)
+
+        cases = {
+            "streak x50": (
+                lambda: [rows_streak(s) for s in student_ids],
+                lambda: [bitmaps.streak(s) for s in student_ids],
+            ),
+            "monthly report": (
+                lambda: rows_monthly_report(1, "FY", "A", *month),
+                lambda: monthly_report(1, "FY", "A", *month),
+            ),
+            "month heatmap x50": (
+                lambda: [rows_day_grid(s, *month) for s in student_ids],
+                lambda: [bitmaps.day_grid(s, *month) for s in student_ids],
+            ),
+            "120-day % x50": (
+                lambda: [rows_window_percentage(s, *window) for s in student_ids],
+                lambda: [bitmaps.window_percentage(s, *window) for s in student_ids],
+            ),
+        }
+
+        timings = {}
+        for name, (rows_path, bitmap_path) in cases.items():
+            rows_time, expected = best(rows_path, args.runs)
+            bitmap_time, result = best(bitmap_path, args.runs)
+            assert result == expected, name
+            timings[name] = (rows_time, bitmap_time)
+
+    print(f"{args.students} students, {args.days} days, 5 subjects")
+    print(f"{'query':>18} {'rows':>8} {'bitmaps':>8}")
+    for name, (rows_time, bitmap_time) in timings.items():
+        print(f"{name:>18} {rows_time:>8.4f} {bitmap_time:>8.4f}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Compare the old per-student/per-subject CC report loop with reports.py.
+
+    python benchmarks/bench_cc_report.py --students 1000 10000 100000 --days 4
+"""
+import argparse
+import os
+
+from common import make_app, seed, timed
+
+from models import Subject, User, Attendance
+from reports import generate_cc_report
+
+
+def legacy_cc_report():
+    # The loop generate_cc_report() used before the aggregate query.
+    students = User.query.filter_by(role="student").order_by(User.id).all()
+    subjects = Subject.query.order_by(Subject.id).all()
+    report = []
+
+    for student in students:
+        row = {"student": student.username}
+        total_present = 0
+        total_classes = 0
+
+        for sub in subjects:
+            records = Attendance.query.filter_by(
+                student_id=student.id,
+                subject_id=sub.id
+            ).all()
+
+            if records:
+                present = sum(r.present for r in records)
+                row[sub.name] = round((present / len(records)) * 100, 2)
+                total_present += present
+                total_classes += len(records)
+            else:
+                row[sub.name] = None
+
+        row["total"] = round(
+            (total_present / total_classes) * 100, 2
+        ) if total_classes else None
+        report.append(row)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--days", type=int, default=4)
+    parser.add_argument(
+        "--legacy-limit", type=int, default=1000,
+        help="skip the legacy loop above this many students"
+    )
+    args = parser.parse_args()
+
+    print(f"{'students':>9} {'impl':>8} {'queries':>9} {'seconds':>9}")
+    for n in args.students:
+        app = make_app()
+        with app.app_context():
+            seed(n, args.days)
+
+            new, secs, queries = timed(generate_cc_report)
+            print(f"{n:>9} {'engine':>8} {queries:>9} {secs:>9.3f}")
+
+            if n <= args.legacy_limit:
+                old, secs, queries = timed(legacy_cc_report)
+                assert old == new, "report mismatch"
+                print(f"{n:>9} {'legacy':>8} {queries:>9} {secs:>9.3f}")
+            else:
+                print(f"{n:>9} {'legacy':>8} {'skipped':>9}")
+
+        os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Concurrent writers: several processes (standing in for gunicorn workers)
+posting /mark_single against one SQLite file, per DB_PROFILE.
+
+    python benchmarks/bench_concurrency.py --workers 4 --requests 200
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from werkzeug.security import generate_password_hash
+
+from common import client_for, load_app, make_app, percentile, seed
+
+from models import db, Subject, User
+
+
+def worker(profile, path, index, requests, start, results):
+    os.environ["DB_PROFILE"] = profile
+    app = load_app(path)
+    client = client_for(app, "bench_teacher", "bench")
+
+    latencies = []
+    errors = 0
+    start.wait()
+    for i in range(requests):
+        began = time.perf_counter()
+        try:
+            response = client.post("/mark_single", data={
+                "student": f"student{(index * requests + i) % 100}",
+                "status": "Present" if i % 2 else "Absent"
+            })
+            if response.status_code != 200:
+                errors += 1
+        except Exception:
+            # TESTING propagates "database is locked" instead of a 500
+            errors += 1
+        latencies.append(time.perf_counter() - began)
+    results.put((latencies, errors, time.perf_counter()))
+
+
+def prepare():
+    app = make_app()
+    with app.app_context():
+        seed(100, 5)
+        python = Subject.query.filter_by(name="Python").first()
+        db.session.add_all([
+            User(username="bench_admin", password="x", role="admin"),
+            User(
+                username="bench_teacher",
+                password=generate_password_hash("bench"),
+                role="teacher",
+                subject_id=python.id
+            ),
+        ])
+        db.session.commit()
+    return app.config["BENCH_DB_PATH"]
+
+
+def run(profile, workers, requests):
+    path = prepare()
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(profile, path, i, requests, start, results))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    # let every worker import the app and log in before the clock starts
+    time.sleep(3)
+    began = time.perf_counter()
+    start.set()
+
+    latencies, errors, finished = [], 0, began
+    for _ in procs:
+        lat, err, done = results.get()
+        latencies += lat
+        errors += err
+        finished = max(finished, done)
+    for p in procs:
+        p.join()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    latencies.sort()
+    elapsed = finished - began
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    args = parser.parse_args()
+
+    print(f"{'profile':>11} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for profile in args.profiles:
+        r = run(profile, args.workers, args.requests)
+        print(f"{profile:>11} {r['requests']:>9} {r['errors']:>7} {r['per_sec']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""What a polling client pays per refresh of the CC dashboard and the
+student page: a full render, the same render gzipped, and a revalidation
+answered 304 through the ETag.
+
+    python benchmarks/bench_conditional.py --students 3000 --days 20
+"""
+import argparse
+import os
+import time
+
+from common import load_app, login, percentile, seed
+
+from models import Subject
+
+
+def measure(client, path, runs, headers):
+    timings, size = [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append(time.perf_counter() - started)
+        size = len(response.data)
+    timings.sort()
+    return response.status_code, size, percentile(timings, 50) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    with app.app_context():
+        seed(args.students, args.days)
+        teacher = login(app, "bench_teacher", "teacher",
+                        subject_id=Subject.query.first().id)
+        student = login(app, "bench_student", "student", year="FY", division="A")
+        cc = login(app, "bench_cc", "cc")
+    teacher.post("/mark_single", data={"student": "bench_student", "status": "Present"})
+
+    print(f"{'page':>8} {'request':>12} {'status':>6} {'bytes':>8} {'p50 ms':>8}")
+    for name, client, path in (("cc", cc, "/cc"), ("student", student, "/student")):
+        tag = client.get(path).headers["ETag"]
+        for label, headers in (
+            ("full", {}),
+            ("gzip", {"Accept-Encoding": "gzip"}),
+            ("revalidate", {"If-None-Match": tag}),
+        ):
+            status, size, p50 = measure(client, path, args.runs, headers)
+            print(f"{name:>8} {label:>12} {status:>6} {size:>8} {p50:>8.2f}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
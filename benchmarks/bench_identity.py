@@ -0,0 +1,69 @@
+"""Queries per request for the teacher and student routes, with the
+subject cache on and off (IDENTITY_CACHE).
+
+    python benchmarks/bench_identity.py
+"""
+import os
+
+from werkzeug.security import generate_password_hash
+
+from common import client_for, count_queries, load_app, login, seed
+
+from models import db, Subject, User
+
+ROUTES = {
+    "teacher": [
+        ("GET", "/teacher", None),
+        ("GET", "/monthly_chart?year=FY&division=A", None),
+        ("POST", "/mark_single", {"student": "student0", "status": "Present"}),
+        ("POST", "/mark_bulk", {"marks": [{"student": "student0", "status": "Absent"}]}),
+    ],
+    "student": [
+        ("GET", "/student", None),
+    ],
+}
+
+
+def queries(engine, client, method, path, data):
+    with count_queries(engine) as stats:
+        if method == "GET":
+            client.get(path)
+        elif path == "/mark_bulk":
+            client.post(path, json=data)
+        else:
+            client.post(path, data=data)
+    return stats["count"]
+
+
+def main():
+    app = load_app()
+    with app.app_context():
+        seed(30, 10)
+        python = Subject.query.filter_by(name="Python").first()
+        teacher = login(app, "bench_teacher", "teacher", subject_id=python.id)
+
+        student = User.query.filter_by(username="student0").first()
+        student.password = generate_password_hash("bench")
+        db.session.commit()
+
+        engine = db.engine
+        clients = {
+            "teacher": teacher,
+            "student": client_for(app, "student0", "bench"),
+        }
+
+    print(f"{'route':>36} {'uncached':>9} {'cached':>7}")
+    for role, routes in ROUTES.items():
+        for method, path, data in routes:
+            counts = []
+            for enabled in (False, True):
+                app.config["IDENTITY_CACHE"] = enabled
+                queries(engine, clients[role], method, path, data)  # warm the session
+                counts.append(queries(engine, clients[role], method, path, data))
+            print(f"{method + ' ' + path[:31]:>36} {counts[0]:>9} {counts[1]:>7}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Query plans and latencies for the Attendance hot paths, before and after
+`flask --app app upgrade-db` adds the indexes.
+
+    python benchmarks/bench_indexes.py --students 2000 --days 200
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+from common import make_app, seed
+
+from models import db, Attendance
+from migrations import upgrade
+
+
+def hot_queries(day):
+    return {
+        "mark_single": Attendance.query.filter_by(
+            student_id=7, subject_id=2, date=day
+        ).limit(1),
+        "student": Attendance.query.filter_by(
+            student_id=7
+        ).order_by(Attendance.date.desc()),
+        "teacher": Attendance.query.filter_by(date=day),
+        "monthly_chart": Attendance.query.filter_by(
+            student_id=7, subject_id=2
+        ).order_by(Attendance.date),
+    }
+
+
+def plan(query):
+    sql = str(query.statement.compile(
+        db.engine, compile_kwargs={"literal_binds": True}
+    ))
+    rows = db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql))
+    return "; ".join(r[-1] for r in rows)
+
+
+def measure(label, day, repeat):
+    print(f"--- {label}")
+    for name, query in hot_queries(day).items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            query.all()
+        ms = (time.perf_counter() - started) / repeat * 1000
+        print(f"{name:>14} {ms:>10.3f} ms  {plan(query)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        for index in Attendance.__table__.indexes:
+            index.drop(db.engine)
+        seed(args.students, args.days)
+        print(f"rows: {Attendance.query.count()}")
+
+        day = date.today() - timedelta(days=args.days // 2)
+        measure("before", day, args.repeat)
+
+        started = time.perf_counter()
+        upgrade()
+        print(f"upgrade-db took {time.perf_counter() - started:.2f}s")
+
+        measure("after", day, args.repeat)
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Sustained logins per second through the web login, per hash method, with
+and without brute-force clients, each guessing one account's password from its own
+address at --attack-rate attempts per second.
+
+    python benchmarks/bench_login.py --threads 16 --attackers 8 --seconds 10 \
+        --methods scrypt:32768:8:1 scrypt:16384:8:1 pbkdf2:sha256:100000
+
+With the throttle on, an attacker's attempts are refused before hashing
+once its failure budget is spent, so the legitimate logins keep the CPU.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+
+from common import load_app, percentile
+
+from limits import login_throttle
+from models import db, User
+from passwords import passwords
+
+PASSWORD = "bench-password"
+
+
+def worker(app, username, password, address, pause, deadline, results, lock):
+    client = app.test_client()
+    while time.perf_counter() < deadline:
+        time.sleep(pause)
+        started = time.perf_counter()
+        response = client.post(
+            "/", data={"username": username, "password": password},
+            environ_base={"REMOTE_ADDR": address}
+        )
+        elapsed = time.perf_counter() - started
+        # a successful login redirects away from the login page
+        outcome = "ok" if response.status_code == 302 else str(response.status_code)
+        with lock:
+            results[outcome] += 1
+            if outcome == "ok":
+                results.setdefault("latency", []).append(elapsed)
+        client.get("/logout")
+
+
+def run(app, args, throttle):
+    app.config["LOGIN_FAILURES_PER_IP"] = 30 if throttle else 0
+    login_throttle.init_app(app)
+
+    results, lock = Counter(), threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(
+            app, f"bench_user{i % args.users}", PASSWORD, f"10.0.0.{i % 250}", 0,
+            deadline, results, lock
+        ))
+        for i in range(args.threads)
+    ] + [
+        threading.Thread(target=worker, args=(
+            app, "bench_target", "wrong", f"10.9.0.{i % 250}", 1 / args.attack_rate,
+            deadline, results, lock
+        ))
+        for i in range(args.attackers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latency = sorted(results.pop("latency", []))
+    return {
+        "logins_per_sec": results["ok"] / args.seconds,
+        "p95_ms": (percentile(latency, 95) or 0) * 1000,
+        "rejected": results["200"],
+        "throttled": results["429"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", nargs="+", default=["scrypt:32768:8:1"])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attackers", type=int, default=8)
+    parser.add_argument("--attack-rate", type=float, default=20,
+                        help="attempts per second of each attacker")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="PASSWORD_VERIFY_WORKERS")
+    args = parser.parse_args()
+
+    app = load_app()
+    app.config["PASSWORD_VERIFY_WORKERS"] = args.workers
+    passwords.init_app(app)
+    with app.app_context():
+        if not User.query.filter_by(role="admin").first():
+            db.session.add(User(username="bench_admin", password="x", role="admin"))
+        db.session.add_all(
+            User(username=f"bench_user{i}", password="x", role="teacher")
+            for i in range(args.users)
+        )
+        db.session.add(User(username="bench_target", password="x", role="teacher"))
+        db.session.commit()
+
+    print(f"{'method':>22} {'throttle':>9} {'logins/s':>9} {'p95 ms':>8} "
+          f"{'rejected':>9} {'throttled':>10}")
+    for method in args.methods:
+        app.config["PASSWORD_HASH_METHOD"] = method
+        passwords.init_app(app)
+        with app.app_context():
+            hashed = passwords.hash(PASSWORD)
+            User.query.filter(User.username.like("bench_%")).update(
+                {"password": hashed}, synchronize_session=False
+            )
+            db.session.commit()
+
+        for throttle in (False, True):
+            r = run(app, args, throttle)
+            print(f"{method:>22} {'on' if throttle else 'off':>9} "
+                  f"{r['logins_per_sec']:>9.1f} {r['p95_ms']:>8.0f} "
+                  f"{r['rejected']:>9} {r['throttled']:>10}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
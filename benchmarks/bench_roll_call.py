@@ -0,0 +1,63 @@
+"""Roll-call latency: one /mark_single request per student versus one
+/mark_bulk request for the whole class.
+
+    python benchmarks/bench_roll_call.py --sizes 70 200 500
+"""
+import argparse
+import os
+import time
+
+from common import count_queries, load_app, login
+
+from models import db, Subject, User
+
+
+def roll_call_single(client, ids):
+    for student_id in ids:
+        client.post("/mark_single", data={"student_id": student_id, "status": "Present"})
+
+
+def roll_call_bulk(client, ids):
+    client.post("/mark_bulk", json={
+        "marks": [{"student_id": i, "status": "Present"} for i in ids]
+    })
+
+
+def add_class(name, size):
+    users = [
+        User(username=f"{name}_{i}", password="x", role="student")
+        for i in range(size)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    return [u.id for u in users]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[70, 200, 500])
+    args = parser.parse_args()
+
+    app = load_app()
+    with app.app_context():
+        python = Subject.query.filter_by(name="Python").first()
+        client = login(app, "bench_teacher", "teacher", subject_id=python.id)
+
+        print(f"{'class':>6} {'mode':>7} {'requests':>9} {'queries':>8} {'seconds':>9}")
+        for size in args.sizes:
+            for mode, fn, requests in [
+                ("single", roll_call_single, size),
+                ("bulk", roll_call_bulk, 1),
+            ]:
+                ids = add_class(f"{mode}{size}", size)
+                with count_queries() as stats:
+                    started = time.perf_counter()
+                    fn(client, ids)
+                    secs = time.perf_counter() - started
+                print(f"{size:>6} {mode:>7} {requests:>9} {stats['count']:>8} {secs:>9.3f}")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""What a fresh worker pays before serving: importing app.py and building
+the app, then its first requests (the login page, then the CC PDF, which
+is the first thing to need ReportLab).
+
+    python benchmarks/bench_startup.py --runs 5
+
+Every run is a new interpreter against an already initialised database,
+as a gunicorn worker or autoscaled instance would see it. Works on trees
+from before the app factory too, for a before/after comparison.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from statistics import median
+
+from common import ROOT, make_app, seed
+
+WORKER = r"""
+import json, sys, time
+started = time.perf_counter()
+import app as module
+app = module.create_app() if hasattr(module, "create_app") else module.app
+ready = time.perf_counter()
+boot_modules = len(sys.modules)
+reportlab_at_boot = "reportlab" in sys.modules
+# a fresh directory, so the PDF is really built
+app.config["REPORT_CACHE_DIR"] = sys.argv[2]
+client = app.test_client()
+client.get("/")
+first = time.perf_counter()
+with client.session_transaction() as session:
+    session["_user_id"] = sys.argv[1]
+    session["_fresh"] = True
+job = client.post("/cc/export-pdf").get_json()
+while job["status"] == "pending":
+    time.sleep(0.005)
+    job = client.get(job["status_url"]).get_json()
+assert job["status"] == "ready", job
+pdf = time.perf_counter()
+print(json.dumps({
+    "import_ms": (ready - started) * 1000,
+    "first_request_ms": (first - ready) * 1000,
+    "first_pdf_ms": (pdf - first) * 1000,
+    "modules_at_boot": boot_modules,
+    "reportlab_at_boot": reportlab_at_boot,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="write the medians to this file")
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    app = make_app(path)
+    with app.app_context():
+        from models import db, User
+        seed(200, 5)
+        cc = User(username="bench_cc", password="x", role="cc")
+        db.session.add_all([cc, User(username="bench_admin", password="x", role="admin")])
+        db.session.commit()
+        cc_id = str(cc.id)
+
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + path)
+    runs = []
+    try:
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as reports:
+                out = subprocess.run(
+                    [sys.executable, "-c", WORKER, cc_id, reports], cwd=ROOT, env=env,
+                    capture_output=True, text=True, check=True
+                ).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    result = {
+        key: round(median(r[key] for r in runs), 1)
+        for key in ("import_ms", "first_request_ms", "first_pdf_ms", "modules_at_boot")
+    }
+    result["reportlab_at_boot"] = any(r["reportlab_at_boot"] for r in runs)
+    for key, value in result.items():
+        print(f"{key:>18} {value:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
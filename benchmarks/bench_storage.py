@@ -0,0 +1,96 @@
+"""Database size and scan speed of the old string-keyed attendance rows
+versus the id-keyed/boolean rows, on the same synthetic data.
+
+    python benchmarks/bench_storage.py --students 5000 --days 100
+"""
+import argparse
+import os
+import time
+
+from common import make_app, seed
+
+from models import db
+
+LEGACY_DDL = """
+CREATE TABLE legacy_attendance (
+    id INTEGER PRIMARY KEY,
+    student VARCHAR(80) NOT NULL,
+    subject VARCHAR(50) NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    date DATE NOT NULL
+);
+INSERT INTO legacy_attendance (student, subject, status, date)
+SELECT u.username, s.name,
+       CASE WHEN a.present THEN 'Present' ELSE 'Absent' END, a.date
+FROM attendance a
+JOIN user u ON u.id = a.student_id
+JOIN subject s ON s.id = a.subject_id;
+CREATE UNIQUE INDEX legacy_uq ON legacy_attendance (student, subject, date);
+CREATE INDEX legacy_student_date ON legacy_attendance (student, date);
+CREATE INDEX legacy_date ON legacy_attendance (date);
+"""
+
+SCANS = {
+    "legacy": {
+        "group by": "SELECT student, subject, sum(status = 'Present'), count(*) "
+                    "FROM legacy_attendance GROUP BY student, subject",
+        "one student": "SELECT * FROM legacy_attendance "
+                       "WHERE student = 'student7' ORDER BY date",
+    },
+    "compact": {
+        "group by": "SELECT student_id, subject_id, sum(present), count(*) "
+                    "FROM attendance GROUP BY student_id, subject_id",
+        "one student": "SELECT * FROM attendance "
+                       "WHERE student_id = 8 ORDER BY date",
+    },
+}
+
+
+def table_bytes(conn, table):
+    """Bytes used by a table and its indexes (needs the dbstat module)."""
+    try:
+        return conn.exec_driver_sql(
+            "SELECT sum(pgsize) FROM dbstat WHERE name = ? "
+            "OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = ?)",
+            (table, table)
+        ).scalar()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.students, args.days)
+        with db.engine.begin() as conn:
+            for statement in LEGACY_DDL.split(";"):
+                if statement.strip():
+                    conn.exec_driver_sql(statement)
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+
+            print(f"rows: {conn.exec_driver_sql('SELECT count(*) FROM attendance').scalar()}")
+            for layout, table in (("legacy", "legacy_attendance"), ("compact", "attendance")):
+                size = table_bytes(conn, table)
+                size = f"{size / 1048576:.1f} MiB" if size else "n/a"
+                print(f"--- {layout}: {size}")
+
+                for name, sql in SCANS[layout].items():
+                    started = time.perf_counter()
+                    for _ in range(args.repeat):
+                        conn.exec_driver_sql(sql).fetchall()
+                    ms = (time.perf_counter() - started) / args.repeat * 1000
+                    print(f"{name:>12} {ms:>10.2f} ms")
+
+    print(f"file: {os.path.getsize(app.config['BENCH_DB_PATH']) / 1048576:.1f} MiB (both layouts)")
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
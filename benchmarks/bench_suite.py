@@ -0,0 +1,310 @@
+"""Latency (p50/p95/p99), queries per request and peak memory of the hot
+routes, driven through the real app against a synthetic institution.
+
+    python benchmarks/bench_suite.py --students 2000 --days 60 --json before.json
+    python benchmarks/bench_suite.py --workers 4 --json after.json --compare before.json
+
+Every round hits each route once, so the writes of mark_single invalidate
+cached reports the way they would in production. --workers N runs the
+rounds in N processes against the same database file. The api/ routes are
+included when flask-jwt-extended is installed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from common import (
+    client_for, count_queries, division_names, load_app, make_app,
+    percentile, seed, subject_names
+)
+
+from models import db, Subject, User
+
+PASSWORD = "bench"
+
+
+# =========================
+# SCENARIOS
+# =========================
+def export_pdf(env):
+    """Queue the CC PDF, poll until it is built and download it."""
+    job = env["cc"].post("/cc/export-pdf").get_json()
+    while job["status"] == "pending":
+        time.sleep(0.005)
+        job = env["cc"].get(job["status_url"]).get_json()
+    return env["cc"].get(job["download_url"])
+
+
+def mark_single(env):
+    return env["teacher"].post("/mark_single", data={
+        "student": f"student{env['random'].randrange(env['students'])}",
+        "status": env["random"].choice(["Present", "Absent"])
+    })
+
+
+# name -> (expected status, request)
+ROUTES = {
+    "login": (302, lambda env: env["app"].test_client().post(
+        "/", data={"username": "bench_teacher", "password": PASSWORD}
+    )),
+    "mark_single": (200, mark_single),
+    "teacher": (200, lambda env: env["teacher"].get("/teacher")),
+    "student": (200, lambda env: env["student"].get("/student")),
+    "monthly_chart": (200, lambda env: env["teacher"].get(
+        "/monthly_chart?year=FY&division=A"
+    )),
+    "cc": (200, lambda env: env["cc"].get("/cc")),
+    "cc_export_pdf": (200, export_pdf),
+}
+
+API_ROUTES = {
+    "api_auth_login": (200, lambda env: env["api"].post(
+        "/api/auth/login", json={"username": "bench_cc", "password": PASSWORD}
+    )),
+    "api_student_dashboard": (200, lambda env: env["api"].get(
+        "/api/student/dashboard", headers=env["tokens"]["student"]
+    )),
+    "api_student_history": (200, lambda env: env["api"].get(
+        "/api/student/history", headers=env["tokens"]["student"]
+    )),
+    "api_cc_report": (200, lambda env: env["api"].get(
+        "/api/cc/report", headers=env["tokens"]["cc"]
+    )),
+}
+
+
+# =========================
+# SETUP
+# =========================
+def prepare(args):
+    """Seed a throwaway database with the institution and the bench users."""
+    app = make_app()
+    with app.app_context():
+        seed(
+            args.students, args.days,
+            subject_names(args.subjects), division_names(args.divisions)
+        )
+        password = generate_password_hash(PASSWORD)
+        subject = Subject.query.order_by(Subject.id).first()
+        db.session.add_all([
+            User(username="bench_admin", password="x", role="admin"),
+            User(
+                username="bench_teacher", password=password,
+                role="teacher", subject_id=subject.id
+            ),
+            User(username="bench_cc", password=password, role="cc"),
+        ])
+        User.query.filter_by(username="student0").update({"password": password})
+        db.session.commit()
+    return app.config["BENCH_DB_PATH"]
+
+
+def add_api(app):
+    """Register the api/ blueprints (app.py does not) and mint tokens.
+
+    Returns None when flask-jwt-extended is not installed.
+    """
+    try:
+        from flask_jwt_extended import JWTManager, create_access_token
+    except ImportError:
+        return None
+
+    from api.auth import auth_bp
+    from api.cc import api_cc
+    from api.student import api_student
+
+    app.config["JWT_SECRET_KEY"] = "bench-secret-" + "0" * 32
+    # the blueprints use {"username", "role"} as the token identity
+    app.config["JWT_VERIFY_SUB"] = False
+    JWTManager(app)
+    for blueprint in (auth_bp, api_cc, api_student):
+        app.register_blueprint(blueprint)
+
+    with app.app_context():
+        return {
+            role: {"Authorization": "Bearer " + create_access_token(
+                identity={"username": username, "role": role}
+            )}
+            for role, username in (("student", "student0"), ("cc", "bench_cc"))
+        }
+
+
+# =========================
+# RUN
+# =========================
+def run_worker(path, args, index):
+    app = load_app(path)
+    app.config["REPORT_CACHE_DIR"] = path + ".reports"
+    tokens = add_api(app)
+
+    with app.app_context():
+        engine = db.engine
+
+    env = {
+        "app": app,
+        "students": args.students,
+        "random": random.Random(index),
+        "teacher": client_for(app, "bench_teacher", PASSWORD),
+        "student": client_for(app, "student0", PASSWORD),
+        "cc": client_for(app, "bench_cc", PASSWORD),
+        "api": app.test_client(),
+        "tokens": tokens,
+    }
+
+    routes = dict(ROUTES, **(API_ROUTES if tokens else {}))
+    if args.routes:
+        routes = {name: routes[name] for name in args.routes if name in routes}
+
+    samples = {name: [] for name in routes}
+    queries = dict.fromkeys(routes, 0)
+    errors = dict.fromkeys(routes, 0)
+
+    for _, fn in routes.values():
+        fn(env)  # warm up imports, templates and connections
+
+    began = time.perf_counter()
+    for _ in range(args.requests):
+        for name, (expected, fn) in routes.items():
+            with count_queries(engine) as stats:
+                started = time.perf_counter()
+                try:
+                    ok = fn(env).status_code == expected
+                except Exception:
+                    ok = False
+                samples[name].append(time.perf_counter() - started)
+            queries[name] += stats["count"]
+            errors[name] += not ok
+    elapsed = time.perf_counter() - began
+
+    # memory is traced separately: tracemalloc slows everything down
+    peaks = {}
+    for name, (_, fn) in routes.items():
+        tracemalloc.start()
+        fn(env)
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "samples": samples,
+        "queries": queries,
+        "errors": errors,
+        "peaks": peaks,
+        "elapsed": elapsed,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def summarize(results, args):
+    routes = {}
+    for name in results[0]["samples"]:
+        samples = sorted(s for r in results for s in r["samples"][name])
+        routes[name] = {
+            "requests": len(samples),
+            "errors": sum(r["errors"][name] for r in results),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "queries": round(sum(r["queries"][name] for r in results) / len(samples), 2),
+            "peak_kib": max(r["peaks"][name] for r in results) // 1024,
+        }
+
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "commit": git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            k: v for k, v in vars(args).items() if k not in ("json", "compare")
+        },
+        "requests_per_sec": round(total / max(r["elapsed"] for r in results), 1),
+        "max_rss_mib": round(max(r["max_rss_kib"] for r in results) / 1024, 1),
+        "routes": routes,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(result, baseline=None):
+    header = (f"{'route':>22} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'queries':>8} {'peak KiB':>9}")
+    if baseline:
+        header += f" {'p95 vs base':>12} {'queries vs base':>16}"
+    print(header)
+
+    for name, r in result["routes"].items():
+        line = (f"{name:>22} {r['requests']:>6} {r['errors']:>4} {r['p50_ms']:>8.2f} "
+                f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['queries']:>8.2f} "
+                f"{r['peak_kib']:>9}")
+        old = (baseline or {}).get("routes", {}).get(name)
+        if old:
+            change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            line += f" {change:>+11.1f}% {r['queries'] - old['queries']:>+16.2f}"
+        print(line)
+
+    print(f"{result['requests_per_sec']} requests/s, "
+          f"max RSS {result['max_rss_mib']} MiB, commit {result['commit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--divisions", type=int, default=3)
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=50,
+                        help="rounds per worker; each round hits every route once")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--routes", nargs="+", help="only these routes")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    args = parser.parse_args()
+
+    path = prepare(args)
+    try:
+        if args.workers == 1:
+            results = [run_worker(path, args, 0)]
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(args.workers) as pool:
+                results = pool.starmap(
+                    run_worker, [(path, args, i) for i in range(args.workers)]
+                )
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        shutil.rmtree(path + ".reports", ignore_errors=True)
+
+    result = summarize(results, args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
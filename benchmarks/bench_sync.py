@@ -0,0 +1,100 @@
+"""Delta sync for the mobile app: what a teacher's device downloads to stay
+current, full refresh versus ?since=, and an offline upload applied in one
+transaction versus one request (and commit) per mark.
+
+    python benchmarks/bench_sync.py --students 900 --days 60
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import date, timedelta
+
+from common import make_app, seed
+
+from marking import record_marks
+from models import db, Subject, User
+from sync import MAX_PAGE_SIZE, apply_offline_marks, changes_since
+
+
+def pull(token):
+    """Every page after `token`: (records, bytes, seconds, new token)."""
+    count, size = 0, 0
+    started = time.perf_counter()
+    while True:
+        records, token, more = changes_since(token, MAX_PAGE_SIZE, subject_id=1)
+        count += len(records)
+        size += len(json.dumps({"records": records, "since": token}))
+        if not more:
+            break
+    return count, size, time.perf_counter() - started, token
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, default=900)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--offline-days", type=int, default=3,
+                        help="days of marks taken offline before uploading")
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed(args.students, args.days)
+        teacher = User(username="bench_teacher", password="x", role="teacher",
+                       subject_id=db.session.query(Subject.id).filter_by(name="Python").scalar())
+        db.session.add(teacher)
+        db.session.commit()
+        students = [
+            name for (name,) in db.session.query(User.username)
+            .filter_by(role="student").order_by(User.id)
+        ]
+
+        full = pull(None)
+        token = full[3]
+
+        # today's roll call, taken online
+        record_marks(teacher.subject_id, date.today(),
+                     {i: "Absent" for i in range(1, args.students // 10 + 1)})
+        delta = pull(token)
+
+        marks = [
+            {"key": uuid.uuid4().hex, "student": name,
+             "date": (date.today() - timedelta(days=d)).isoformat(),
+             "status": "Present" if (i + d) % 4 else "Absent", "base": token}
+            for d in range(1, args.offline_days + 1)
+            for i, name in enumerate(students)
+        ]
+        started = time.perf_counter()
+        results = apply_offline_marks(teacher.id, teacher.subject_id, marks)
+        batched = time.perf_counter() - started
+        retry_started = time.perf_counter()
+        apply_offline_marks(teacher.id, teacher.subject_id, marks)
+        retry = time.perf_counter() - retry_started
+
+        ids = dict(db.session.query(User.username, User.id).filter_by(role="student"))
+        sample = marks[:200]
+        started = time.perf_counter()
+        for m in sample:
+            record_marks(teacher.subject_id, date.fromisoformat(m["date"]),
+                         {ids[m["student"]]: "Absent" if m["status"] == "Present" else "Present"})
+        per_mark = (time.perf_counter() - started) / len(sample) * len(marks)
+
+    print(f"{'download':>14} {'records':>8} {'KiB':>8} {'seconds':>8}")
+    for name, (count, size, seconds, _) in (("full refresh", full), ("since=token", delta)):
+        print(f"{name:>14} {count:>8} {size / 1024:>8.1f} {seconds:>8.3f}")
+
+    outcomes = {}
+    for r in results:
+        outcomes[r["result"]] = outcomes.get(r["result"], 0) + 1
+    print(f"\nupload of {len(marks)} offline marks: {outcomes}")
+    print(f"{'one transaction':>22} {batched:>8.3f}s")
+    print(f"{'retried (all dupes)':>22} {retry:>8.3f}s")
+    print(f"{'one commit per mark':>22} {per_mark:>8.3f}s (extrapolated from {len(sample)})")
+
+    os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Teacher dashboard: the old institution-wide aggregate over today's
+attendance rows versus the per-class lookup in the daily rollup.
+
+    python benchmarks/bench_teacher.py --students 5000 10000 50000 --days 5
+"""
+import argparse
+import os
+from datetime import date, timedelta
+
+from common import make_app, seed, timed
+
+from models import db, Attendance
+from reports import daily_summary
+
+
+def legacy_daily_summary(day):
+    # what the dashboard computed before the rollup, for every subject
+    present, total = db.session.query(
+        db.func.sum(db.case((Attendance.present.is_(True), 1), else_=0)),
+        db.func.count(Attendance.id)
+    ).filter(Attendance.date == day).one()
+    return {"total": total, "present": present or 0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--students", type=int, nargs="+", default=[5000, 10000, 50000])
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # seed() writes up to yesterday
+    day = date.today() - timedelta(days=1)
+
+    print(f"{'students':>9} {'impl':>8} {'queries':>8} {'ms':>8}")
+    for n in args.students:
+        app = make_app()
+        with app.app_context():
+            seed(n, args.days)
+
+            for impl, fn in (
+                ("legacy", lambda: legacy_daily_summary(day)),
+                ("rollup", lambda: daily_summary(day, 1)),
+            ):
+                fn()
+                _, secs, queries = timed(lambda: [fn() for _ in range(args.repeat)])
+                print(f"{n:>9} {impl:>8} {queries // args.repeat:>8} "
+                      f"{secs / args.repeat * 1000:>8.3f}")
+
+        os.remove(app.config["BENCH_DB_PATH"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+from models import db, Subject, User, Attendance
+from summaries import rebuild_summaries
+
+SUBJECTS = ["Python", "Java", "MIC", "ES", "DCN"]
+YEARS = ["FY", "SY", "TY"]
+DIVISIONS = ["A", "B", "C"]
+
+
+def make_app(path=None):
+    """Flask app bound to a throwaway SQLite file, with only the models loaded."""
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    app.config["BENCH_DB_PATH"] = path
+    return app
+
+
+def load_app(path=None):
+    """The real app.py, pointed at a throwaway SQLite file."""
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    from app import create_app
+    from migrations import bootstrap
+
+    app = create_app({"TESTING": True, "BENCH_DB_PATH": path})
+    with app.app_context():
+        bootstrap()
+    return app
+
+
+def login(app, username, role, password="bench", **extra):
+    """Create a user and return a test client logged in as them."""
+    from werkzeug.security import generate_password_hash
+
+    # the login page redirects to /setup until an admin exists
+    if not User.query.filter_by(role="admin").first():
+        db.session.add(User(username="bench_admin", password="x", role="admin"))
+
+    db.session.add(User(
+        username=username,
+        password=generate_password_hash(password),
+        role=role,
+        **extra
+    ))
+    db.session.commit()
+
+    return client_for(app, username, password)
+
+
+def client_for(app, username, password):
+    """A test client logged in with existing credentials."""
+    client = app.test_client()
+    response = client.post("/", data={"username": username, "password": password})
+    assert response.status_code == 302 and "/setup" not in response.location
+    return client
+
+
+def subject_names(count):
+    """The app's own subjects first, then made-up ones."""
+    return (SUBJECTS + [f"Subject{i}" for i in range(len(SUBJECTS), count)])[:count]
+
+
+def division_names(count):
+    return [chr(ord("A") + i) for i in range(count)]
+
+
+def seed(students, days, subjects=SUBJECTS, divisions=DIVISIONS, chunk=50000):
+    """Insert `students` users and `days` of attendance for every subject.
+
+    Students are spread round-robin over YEARS and then `divisions`.
+    """
+    db.create_all()
+    existing = {name for (name,) in db.session.query(Subject.name)}
+    missing = [{"name": s} for s in subjects if s not in existing]
+    if missing:
+        db.session.execute(insert(Subject), missing)
+    db.session.execute(insert(User), [
+        {
+            "username": f"student{i}",
+            "password": "x",
+            "role": "student",
+            "year": YEARS[i % len(YEARS)],
+            "division": divisions[(i // len(YEARS)) % len(divisions)],
+            "is_active": True
+        }
+        for i in range(students)
+    ])
+
+    student_ids = [
+        i for (i,) in db.session.query(User.id)
+        .filter_by(role="student").order_by(User.id)
+    ]
+    subject_ids = [
+        i for (i,) in db.session.query(Subject.id)
+        .filter(Subject.name.in_(subjects)).order_by(Subject.id)
+    ]
+
+    rnd = random.Random(42)
+    start = date.today() - timedelta(days=days)
+    batch = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        for student_id in student_ids:
+            for subject_id in subject_ids:
+                batch.append({
+                    "student_id": student_id,
+                    "subject_id": subject_id,
+                    "present": rnd.random() < 0.8,
+                    "date": day
+                })
+                if len(batch) >= chunk:
+                    db.session.execute(insert(Attendance), batch)
+                    batch = []
+    if batch:
+        db.session.execute(insert(Attendance), batch)
+    db.session.commit()
+    rebuild_summaries()
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Yield a dict whose "count" is the number of statements executed.
+
+    Pass the engine when counting test-client requests made outside an app
+    context, so each request gets its own session as it would when served.
+    """
+    stats = {"count": 0}
+
+    def on_execute(*args):
+        stats["count"] += 1
+
+    engine = engine or db.engine
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(1, -(-len(samples) * pct // 100))
+    return samples[int(rank) - 1]
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn once and return (result, seconds, queries)."""
+    with count_queries() as stats:
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+    return result, elapsed, stats["count"]
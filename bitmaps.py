@@ -0,0 +1,235 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from models import db, Attendance, AttendanceBitmap, ALL_SUBJECTS, upsert
+
+# one bit per day of a leap year, as little-endian bytes
+YEAR_BITS = 366
+BITMAP_BYTES = (YEAR_BITS + 7) // 8
+
+REBUILD_STUDENTS = 1000
+
+
+# =========================
+# BITS
+# =========================
+def slot(day):
+    """(year, bit) of a day."""
+    return day.year, day.timetuple().tm_yday - 1
+
+
+def day_of(year, bit):
+    return date(year, 1, 1) + timedelta(days=bit)
+
+
+def to_int(blob):
+    return int.from_bytes(blob, "little")
+
+
+def to_blob(bits):
+    return bits.to_bytes(BITMAP_BYTES, "little")
+
+
+def span_mask(year, start, end):
+    """Bits of `year` from `start` to `end` inclusive; 0 if they do not overlap."""
+    if start.year > year or end.year < year:
+        return 0
+    first = slot(start)[1] if start.year == year else 0
+    last = slot(end)[1] if end.year == year else YEAR_BITS - 1
+    return (1 << last + 1) - (1 << first)
+
+
+def iter_bits(bits):
+    """Positions of the set bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+# =========================
+# WRITES
+# =========================
+def apply_bitmaps(subject_id, day, statuses, previous):
+    """Set the day's bits for the students whose mark changed.
+
+    Same arguments as summaries.apply_marks; must run in the same
+    transaction as the attendance write.
+    """
+    changed = [s for s in statuses if previous.get(s) != statuses[s]]
+    if not changed:
+        return
+
+    year, bit = slot(day)
+    found = {
+        student_id: (to_int(present), to_int(marked))
+        for student_id, present, marked in db.session.query(
+            AttendanceBitmap.student_id, AttendanceBitmap.present, AttendanceBitmap.marked
+        ).filter(
+            AttendanceBitmap.student_id.in_(changed),
+            AttendanceBitmap.subject_id == subject_id,
+            AttendanceBitmap.year == year
+        )
+    }
+
+    rows = []
+    for student_id in changed:
+        present, marked = found.get(student_id, (0, 0))
+        if statuses[student_id] == "Present":
+            present |= 1 << bit
+        else:
+            present &= ~(1 << bit)
+        rows.append({
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "year": year,
+            "present": to_blob(present),
+            "marked": to_blob(marked | 1 << bit)
+        })
+
+    insert_bitmap = upsert(AttendanceBitmap)
+    db.session.execute(insert_bitmap.on_conflict_do_update(
+        index_elements=["student_id", "subject_id", "year"],
+        set_={
+            "present": insert_bitmap.excluded.present,
+            "marked": insert_bitmap.excluded.marked
+        }
+    ), rows)
+
+
+def rebuild_bitmaps(students=REBUILD_STUDENTS):
+    """Refill every bitmap from the attendance table, a slice of students
+    at a time so memory stays bounded. Runs in the caller's transaction."""
+    db.session.execute(delete(AttendanceBitmap))
+    student_ids = [
+        s for (s,) in db.session.query(Attendance.student_id).distinct().order_by(Attendance.student_id)
+    ]
+    written = 0
+
+    for i in range(0, len(student_ids), students):
+        chunk = student_ids[i:i + students]
+        bits = defaultdict(lambda: [0, 0])
+        for student_id, subject_id, day, present in db.session.connection().execute(
+            select(Attendance.student_id, Attendance.subject_id, Attendance.date, Attendance.present)
+            .where(Attendance.student_id.between(chunk[0], chunk[-1]))
+        ):
+            year, bit = slot(day)
+            entry = bits[(student_id, subject_id, year)]
+            entry[1] |= 1 << bit
+            if present:
+                entry[0] |= 1 << bit
+
+        db.session.execute(insert(AttendanceBitmap), [
+            {
+                "student_id": student_id, "subject_id": subject_id, "year": year,
+                "present": to_blob(present), "marked": to_blob(marked)
+            }
+            for (student_id, subject_id, year), (present, marked) in bits.items()
+        ])
+        written += len(bits)
+
+    return written
+
+
+# =========================
+# READS
+# =========================
+def load(student_ids, subject_id=ALL_SUBJECTS, years=None):
+    """{(student_id, subject_id, year): (present, marked)} as ints; every
+    subject for ALL_SUBJECTS, every year unless `years` is given."""
+    query = db.session.query(
+        AttendanceBitmap.student_id,
+        AttendanceBitmap.subject_id,
+        AttendanceBitmap.year,
+        AttendanceBitmap.present,
+        AttendanceBitmap.marked
+    ).filter(AttendanceBitmap.student_id.in_(student_ids))
+    if subject_id != ALL_SUBJECTS:
+        query = query.filter(AttendanceBitmap.subject_id == subject_id)
+    if years is not None:
+        query = query.filter(AttendanceBitmap.year.in_(years))
+
+    return {
+        (student_id, sub, year): (to_int(present), to_int(marked))
+        for student_id, sub, year, present, marked in query
+    }
+
+
+def streak(student_id, subject_id=ALL_SUBJECTS):
+    """(streak, last_date, last_absent) as kept in AttendanceSummary: the
+    "Present" marks dated after the latest "Absent" one, the latest marked
+    day and the latest absent day (None if there are none).
+
+    Works back a year at a time and stops at the first year with an
+    absence, so it reads a handful of small rows however long the history.
+    """
+    by_year = defaultdict(list)
+    for (_, _, year), bits in load([student_id], subject_id).items():
+        by_year[year].append(bits)
+
+    count, last_date, last_absent = 0, None, None
+    for year in sorted(by_year, reverse=True):
+        marked = absent = 0
+        for present, marks in by_year[year]:
+            marked |= marks
+            absent |= marks & ~present
+        if last_date is None and marked:
+            last_date = day_of(year, marked.bit_length() - 1)
+
+        after = absent.bit_length()   # first bit after the latest absence
+        count += sum((present >> after).bit_count() for present, _ in by_year[year])
+        if absent:
+            last_absent = day_of(year, after - 1)
+            break
+
+    return count, last_date, last_absent
+
+
+def marks_between(student_ids, subject_id, start, end):
+    """{student_id: (present, total, [(day, present), ...])} for one subject
+    between `start` and `end` inclusive, days in order; students without
+    marks are left out."""
+    years = range(start.year, end.year + 1)
+    masks = {year: span_mask(year, start, end) for year in years}
+    found = defaultdict(lambda: [0, 0, []])
+
+    bitmaps = load(student_ids, subject_id, years)
+    for (student_id, _, year), (present, marked) in sorted(bitmaps.items()):
+        marked &= masks[year]
+        if not marked:
+            continue
+        present &= marked
+        entry = found[student_id]
+        entry[0] += present.bit_count()
+        entry[1] += marked.bit_count()
+        entry[2].extend(
+            (day_of(year, bit), bool(present >> bit & 1)) for bit in iter_bits(marked)
+        )
+
+    return {student_id: tuple(entry) for student_id, entry in found.items()}
+
+
+def day_grid(student_id, start, end):
+    """{day: (present, absent)} mark counts over all subjects, for the days
+    between `start` and `end` with at least one mark."""
+    years = range(start.year, end.year + 1)
+    grid = defaultdict(lambda: [0, 0])
+    for (_, _, year), (present, marked) in load([student_id], ALL_SUBJECTS, years).items():
+        marked &= span_mask(year, start, end)
+        for bit in iter_bits(marked):
+            grid[day_of(year, bit)][0 if present >> bit & 1 else 1] += 1
+    return {day: tuple(counts) for day, counts in sorted(grid.items())}
+
+
+def window_percentage(student_id, start, end, subject_id=ALL_SUBJECTS):
+    """(present, total, percent) over a date window; percent is None
+    without marks."""
+    present = total = 0
+    years = range(start.year, end.year + 1)
+    for (_, _, year), (p, marked) in load([student_id], subject_id, years).items():
+        marked &= span_mask(year, start, end)
+        present += (p & marked).bit_count()
+        total += marked.bit_count()
+    return present, total, round(present * 100 / total, 2) if total else None
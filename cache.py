@@ -0,0 +1,205 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from versions import current
+
+_MISSING = object()
+
+
+# =========================
+# BACKENDS
+# =========================
+class MemoryBackend:
+    """LRU dict private to one process."""
+
+    name = "memory"
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.time():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """LRU table in its own SQLite file, shared by every worker on the host."""
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            if row[1] < now:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return _MISSING
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), now + ttl, now)
+            )
+            evicted = conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.evictions += evicted
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+
+# =========================
+# REPORT CACHE
+# =========================
+class ReportCache:
+    """Computed reports keyed by name, parameters and data versions.
+
+    The data versions are bumped by every attendance write (see
+    marking.record_marks), so a write makes the old entries unreachable
+    at once; TTL and LRU eviction then reclaim the space.
+
+    Config: REPORT_CACHE_BACKEND ("memory" or "sqlite"), REPORT_CACHE_TTL
+    (seconds), REPORT_CACHE_SIZE (entries) and REPORT_CACHE_PATH (sqlite).
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.setdefault(
+            "REPORT_CACHE_BACKEND", os.environ.get("REPORT_CACHE_BACKEND", "memory")
+        )
+        self.ttl = app.config.setdefault(
+            "REPORT_CACHE_TTL", int(os.environ.get("REPORT_CACHE_TTL", 300))
+        )
+        size = app.config.setdefault(
+            "REPORT_CACHE_SIZE", int(os.environ.get("REPORT_CACHE_SIZE", 256))
+        )
+
+        if kind == "sqlite":
+            path = app.config.setdefault(
+                "REPORT_CACHE_PATH",
+                os.environ.get("REPORT_CACHE_PATH")
+                or os.path.join(app.instance_path, "report_cache.db")
+            )
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.backend = SQLiteBackend(path, size)
+        elif kind == "memory":
+            self.backend = MemoryBackend(size)
+        else:
+            raise ValueError(f"Unknown REPORT_CACHE_BACKEND: {kind}")
+
+        app.extensions["report_cache"] = self
+
+    def cached(self, name, params, depends, compute):
+        """Return the cached value for (name, params) at the current versions
+        of `depends`, calling compute() on a miss."""
+        key = json.dumps(
+            [name, params, current(*depends)], sort_keys=True, default=str
+        )
+
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = compute()
+        self.backend.set(key, value, self.ttl)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        """Counters for this process; entries are shared with the sqlite backend."""
+        return {
+            "backend": self.backend.name,
+            "pid": os.getpid(),
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "ttl": self.ttl,
+            "max_entries": self.backend.max_entries
+        }
+
+
+report_cache = ReportCache()
@@ -0,0 +1,161 @@
+import os
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# DB_PROFILE picks one of these; single settings can still be overridden
+# from the environment (see configure_database)
+PROFILES = {
+    # SQLite's own defaults: rollback journal, fsync on every commit
+    "default": {
+        "pragmas": {},
+        "pool": {},
+    },
+    # several gunicorn workers writing to one SQLite file
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -20000,
+            "temp_store": "MEMORY",
+        },
+        "pool": {
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        },
+    },
+}
+
+# environment variable -> (section, setting, type)
+OVERRIDES = {
+    "SQLITE_JOURNAL_MODE": ("pragmas", "journal_mode", str),
+    "SQLITE_SYNCHRONOUS": ("pragmas", "synchronous", str),
+    "SQLITE_BUSY_TIMEOUT": ("pragmas", "busy_timeout", int),
+    "SQLITE_CACHE_SIZE": ("pragmas", "cache_size", int),
+    "DB_POOL_SIZE": ("pool", "pool_size", int),
+    "DB_MAX_OVERFLOW": ("pool", "max_overflow", int),
+    "DB_POOL_TIMEOUT": ("pool", "pool_timeout", int),
+    "DB_POOL_RECYCLE": ("pool", "pool_recycle", int),
+}
+
+REPLICA = "replica"
+
+
+# =========================
+# SESSION
+# =========================
+class RoutingSession(Session):
+    """Sends reads to the replica bind while use_replica() is in effect.
+
+    Flushes always go to the primary, and without a replica configured
+    nothing changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() \
+                and g.get("_read_replica"):
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica():
+    """Serve the rest of this app context's reads from the replica."""
+    from versions import forget
+
+    g._read_replica = True
+    # versions already read from the primary could be ahead of the
+    # replica, and would cache the replica's older data under newer keys
+    forget()
+
+
+def read_replica(view):
+    """Decorator for report views that can tolerate replication lag."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        use_replica()
+        return view(*args, **kwargs)
+    return wrapped
+
+
+# =========================
+# CONFIGURATION
+# =========================
+def database_profile(environ=os.environ):
+    """The DB_PROFILE settings with any environment overrides applied."""
+    name = environ.get("DB_PROFILE", "default")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE: {name}")
+
+    profile = {
+        "name": name,
+        "pragmas": dict(PROFILES[name]["pragmas"]),
+        "pool": dict(PROFILES[name]["pool"]),
+    }
+    for var, (section, key, cast) in OVERRIDES.items():
+        if environ.get(var):
+            profile[section][key] = cast(environ[var])
+    return profile
+
+
+def _engine_options(url, pool):
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return dict(pool)
+
+    # in-memory databases use a single shared connection, not a pool
+    if url.database in (None, "", ":memory:"):
+        return {}
+    options = dict(pool)
+    options.pop("pool_pre_ping", None)
+    return options
+
+
+def configure_database(app, environ=os.environ):
+    """Fill in the SQLAlchemy config from the environment.
+
+    DATABASE_URL is the primary, DATABASE_REPLICA_URL an optional copy
+    that report views read from, and DB_PROFILE the tuning to apply.
+    """
+    profile = database_profile(environ)
+    url = environ.get("DATABASE_URL", "sqlite:///attendance.db")
+    replica = environ.get("DATABASE_REPLICA_URL")
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = _engine_options(url, profile["pool"])
+    if replica:
+        app.config["SQLALCHEMY_BINDS"] = {
+            REPLICA: {"url": replica, **_engine_options(replica, profile["pool"])}
+        }
+    app.config["DB_PROFILE"] = profile
+
+
+def init_database(app, db):
+    """db.init_app plus the per-connection SQLite pragmas of the profile."""
+    db.init_app(app)
+
+    pragmas = app.config.get("DB_PROFILE", {}).get("pragmas")
+    if not pragmas:
+        return
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _pragma_setter(pragmas))
+
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return set_pragmas
@@ -0,0 +1,292 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import tuple_
+
+from archive import archives
+from database import use_replica
+from models import db, Attendance, Subject, User, status_label
+from reports import generate_cc_report
+from versions import current
+
+# a build that has been "pending" this long is assumed to have died with
+# its worker and is started again
+PENDING_TIMEOUT = 600
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf-export")
+
+
+# =========================
+# PDF RENDERING
+# =========================
+def build_cc_pdf(report_data):
+    """Render the CC report rows to PDF bytes."""
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    subjects = [
+        k for k in (report_data[0] if report_data else {})
+        if k not in ("student", "total")
+    ]
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    styles = getSampleStyleSheet()
+    elements = []
+
+    elements.append(
+        Paragraph("<b>Full Student Attendance Report</b>", styles["Title"])
+    )
+    elements.append(Paragraph("<br/>", styles["Normal"]))
+
+    table_data = [["Student"] + subjects + ["Total %"]]
+
+    for r in report_data:
+        table_data.append(
+            [r["student"]]
+            + [r[sub] if r[sub] is not None else "—" for sub in subjects]
+            + [r["total"] if r["total"] is not None else "—"]
+        )
+
+    table = Table(table_data, colWidths=[90] + [60] * (len(subjects) + 1))
+    table.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
+        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+    ]))
+
+    elements.append(table)
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# report name -> (data versions it depends on, builder taking the report's
+# params as keyword arguments and returning bytes)
+REPORTS = {
+    "cc": (
+        ("attendance", "users", "subjects", "archive"),
+        lambda academic_year=None: build_cc_pdf(generate_cc_report(academic_year))
+    ),
+}
+
+
+# =========================
+# BACKGROUND JOBS
+# =========================
+# State lives in the cache directory rather than in memory so every
+# gunicorn worker sees the same jobs:
+#   <key>.pdf      finished artifact
+#   <key>.pending  build in progress
+#   <key>.error    last build failed (holds the message)
+def cache_dir(app):
+    path = app.config.get("REPORT_CACHE_DIR") or os.path.join(
+        app.instance_path, "report_cache"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def report_key(name, params=None):
+    """Cache key for a report at the current data version."""
+    depends, _ = REPORTS[name]
+    payload = json.dumps(
+        [name, params or {}, current(*depends)], sort_keys=True, default=str
+    )
+    return f"{name}-{hashlib.sha256(payload.encode()).hexdigest()[:24]}"
+
+
+def valid_key(key):
+    return re.fullmatch(r"[a-z]+-[0-9a-f]{24}", key) is not None
+
+
+def artifact_path(app, key):
+    return os.path.join(cache_dir(app), key + ".pdf")
+
+
+def job_status(app, key):
+    """One of "ready", "pending", "failed" or "missing"."""
+    base = os.path.join(cache_dir(app), key)
+
+    if os.path.exists(base + ".pdf"):
+        return "ready"
+    if os.path.exists(base + ".pending"):
+        if time.time() - os.path.getmtime(base + ".pending") < PENDING_TIMEOUT:
+            return "pending"
+        return "missing"
+    if os.path.exists(base + ".error"):
+        return "failed"
+    return "missing"
+
+
+def start_job(app, name, key, params=None):
+    """Queue a build of `key`, made by report_key(name, params), unless it
+    is already built or building."""
+    status = job_status(app, key)
+    if status in ("ready", "pending"):
+        return status
+
+    base = os.path.join(cache_dir(app), key)
+    try:
+        # O_EXCL: only one worker gets to claim the build
+        os.close(os.open(base + ".pending", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        status = job_status(app, key)
+        if status != "missing":
+            return status
+        # stale marker left behind by a dead worker
+        os.utime(base + ".pending")
+
+    if os.path.exists(base + ".error"):
+        os.remove(base + ".error")
+
+    _executor.submit(_run_job, app, name, key, params)
+    return "pending"
+
+
+def _run_job(app, name, key, params=None):
+    base = os.path.join(cache_dir(app), key)
+    _, builder = REPORTS[name]
+
+    try:
+        # the key was made from the primary's versions; build from the
+        # replica only once it has caught up with them, so the artifact
+        # never holds older data than its key says
+        data = None
+        with app.app_context():
+            use_replica()
+            if report_key(name, params) == key:
+                data = builder(**(params or {}))
+        if data is None:
+            with app.app_context():
+                data = builder(**(params or {}))
+
+        tmp = base + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, base + ".pdf")
+        _prune(app, name, keep=key)
+    except Exception as e:
+        app.logger.exception("PDF export %s failed", key)
+        with open(base + ".error", "w") as f:
+            f.write(str(e))
+    finally:
+        if os.path.exists(base + ".pending"):
+            os.remove(base + ".pending")
+
+
+def _prune(app, name, keep):
+    """Drop artifacts of older data versions of the same report."""
+    directory = cache_dir(app)
+    for filename in os.listdir(directory):
+        if filename.startswith(name + "-") and filename.endswith(".pdf") \
+                and filename != keep + ".pdf":
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+# =========================
+# RAW ATTENDANCE
+# =========================
+EXPORT_BATCH = 5000
+
+EXPORT_COLUMNS = (
+    "id", "date", "student_id", "student", "year", "division",
+    "subject_id", "subject", "status"
+)
+
+# format -> mimetype
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+}
+
+
+def iter_attendance(start=None, end=None, year=None, division=None,
+                    subject_id=None, batch=EXPORT_BATCH):
+    """Raw attendance rows, oldest first, as tuples in EXPORT_COLUMNS order.
+
+    Fetched in keyset batches on (date, id), so memory stays at one batch
+    whatever the size of the table. Archived academic years in the range
+    are read from their archives first.
+    """
+    yield from archives.iter_attendance(start, end, year, division, subject_id, batch)
+
+    query = (
+        db.session.query(
+            Attendance.id,
+            Attendance.date,
+            Attendance.student_id,
+            User.username,
+            User.year,
+            User.division,
+            Attendance.subject_id,
+            Subject.name,
+            Attendance.present
+        )
+        .join(User, User.id == Attendance.student_id)
+        .join(Subject, Subject.id == Attendance.subject_id)
+        .order_by(Attendance.date, Attendance.id)
+    )
+
+    if start:
+        query = query.filter(Attendance.date >= start)
+    if end:
+        query = query.filter(Attendance.date <= end)
+    if year:
+        query = query.filter(User.year == year)
+    if division:
+        query = query.filter(User.division == division)
+    if subject_id:
+        query = query.filter(Attendance.subject_id == subject_id)
+
+    after = None
+    while True:
+        page = query
+        if after:
+            page = page.filter(tuple_(Attendance.date, Attendance.id) > after)
+
+        rows = page.limit(batch).all()
+        for row in rows:
+            yield (*row[:-1], status_label(row.present))
+
+        if len(rows) < batch:
+            return
+        after = (rows[-1].date, rows[-1].id)
+
+
+def stream_csv(rows, compress=False, chunk_rows=1000):
+    """Encode rows as CSV with a header line, in byte chunks of
+    `chunk_rows` rows, gzip-compressed if asked."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+
+    def drain():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip.compress(data) if gzip else data
+
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % chunk_rows == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+
+    chunk = drain() + (gzip.flush() if gzip else b"")
+    if chunk:
+        yield chunk
@@ -0,0 +1,7 @@
+# gunicorn reads this file from the working directory.
+#
+# Build the app once in the master and fork the workers from it, so a
+# worker (re)start costs a fork instead of an import. Safe because
+# create_app() opens no database connections and starts no threads; the
+# schema is created before the server starts, by `flask --app app init-db`.
+preload_app = True
@@ -0,0 +1,77 @@
+from datetime import date
+
+from sqlalchemy import tuple_
+
+from archive import archives
+from models import db, Attendance, Subject, status_label
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+# =========================
+# KEYSET PAGING
+# =========================
+def encode_cursor(row):
+    return f"{row.date.isoformat()}.{row.id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    day, _, row_id = cursor.partition(".")
+    return date.fromisoformat(day), int(row_id)
+
+
+def _serialize(row):
+    return {
+        "id": row.id,
+        "subject": row.subject,
+        "status": status_label(row.present),
+        "date": row.date.isoformat()
+    }
+
+
+def history_page(student_id, cursor=None, limit=PAGE_SIZE):
+    """One page of a student's marks, newest first.
+
+    Pages are keyed on (date, id) rather than OFFSET, so every page is an
+    index range scan no matter how deep it is. Once the live rows run out,
+    paging carries on into the archived academic years, which all come
+    before them. Returns (records, next_cursor); next_cursor is None on the
+    last page.
+    """
+    query = (
+        db.session.query(
+            Attendance.id,
+            Attendance.date,
+            Attendance.present,
+            Subject.name.label("subject")
+        )
+        .join(Subject, Subject.id == Attendance.subject_id)
+        .filter(Attendance.student_id == student_id)
+        .order_by(Attendance.date.desc(), Attendance.id.desc())
+    )
+
+    before = decode_cursor(cursor) if cursor else None
+    if before:
+        query = query.filter(tuple_(Attendance.date, Attendance.id) < before)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        rows += archives.history_rows(
+            student_id,
+            (rows[-1].date, rows[-1].id) if rows else before,
+            limit + 1 - len(rows)
+        )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [_serialize(r) for r in rows[:limit]], next_cursor
+
+
+def iter_history(student_id, batch=MAX_PAGE_SIZE):
+    """Every mark of a student, newest first, fetched one page at a time."""
+    cursor = None
+    while True:
+        records, cursor = history_page(student_id, cursor, batch)
+        yield from records
+        if cursor is None:
+            return
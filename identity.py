@@ -0,0 +1,46 @@
+from collections import namedtuple
+
+from flask import current_app
+
+from models import db, Subject
+from versions import current
+
+SubjectInfo = namedtuple("SubjectInfo", ["id", "name"])
+
+
+# =========================
+# SUBJECTS
+# =========================
+class SubjectCache:
+    """Subjects loaded once per process, reloaded when "subjects" is bumped."""
+
+    def __init__(self):
+        # database url -> (version, {id: SubjectInfo})
+        self._loaded = {}
+
+    def _subjects(self):
+        if not current_app.config.get("IDENTITY_CACHE", True):
+            return self._query()
+
+        version, = current("subjects")
+        url = str(db.engine.url)
+        loaded = self._loaded.get(url)
+
+        if loaded is None or loaded[0] != version:
+            loaded = self._loaded[url] = (version, self._query())
+        return loaded[1]
+
+    def _query(self):
+        return {
+            i: SubjectInfo(i, name)
+            for i, name in db.session.query(Subject.id, Subject.name).order_by(Subject.id)
+        }
+
+    def get(self, subject_id):
+        return self._subjects().get(subject_id)
+
+    def all(self):
+        return list(self._subjects().values())
+
+
+subject_cache = SubjectCache()
@@ -0,0 +1,180 @@
+import math
+import os
+import threading
+import time
+
+from flask import g, jsonify, request
+
+
+def parse_limits(value):
+    """"endpoint=N,*=M" -> {"endpoint": N, "*": M}; 0 means no limit."""
+    limits = {}
+    for item in filter(None, (value or "").split(",")):
+        endpoint, _, limit = item.strip().rpartition("=")
+        limits[endpoint] = int(limit) or None
+    return limits
+
+
+# =========================
+# CONCURRENCY LIMITS
+# =========================
+class ConcurrencyLimits:
+    """Caps how many requests to one endpoint run at once in this process.
+
+    API_CONCURRENCY maps endpoint names to a limit, with "*" applying to
+    each endpoint not listed (the API_CONCURRENCY environment variable uses
+    the "endpoint=N,*=M" form). A request that gets no slot within
+    API_QUEUE_TIMEOUT seconds is answered 503 with Retry-After, so a burst
+    of slow report calls queues among itself instead of taking every worker
+    thread from the fast endpoints.
+    """
+
+    def __init__(self, app=None):
+        self.limits = {}
+        self.timeout = 2.0
+        self.rejected = 0
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limits = app.config.setdefault(
+            "API_CONCURRENCY", parse_limits(os.environ.get("API_CONCURRENCY"))
+        )
+        self.timeout = app.config.setdefault(
+            "API_QUEUE_TIMEOUT", float(os.environ.get("API_QUEUE_TIMEOUT", 2))
+        )
+
+        app.before_request(self._acquire)
+        app.teardown_request(self._release)
+        app.extensions["concurrency_limits"] = self
+
+    def _semaphore(self, endpoint):
+        limit = self.limits.get(endpoint, self.limits.get("*"))
+        if not limit:
+            return None
+        with self._lock:
+            if endpoint not in self._semaphores:
+                self._semaphores[endpoint] = threading.BoundedSemaphore(limit)
+            return self._semaphores[endpoint]
+
+    def _acquire(self):
+        semaphore = self._semaphore(request.endpoint)
+        if semaphore is None:
+            return None
+
+        if not semaphore.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            response = jsonify({"status": "error", "message": "Server busy, retry shortly"})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+
+        g._concurrency_slot = semaphore
+        return None
+
+    def _release(self, exc):
+        semaphore = g.pop("_concurrency_slot", None)
+        if semaphore is not None:
+            semaphore.release()
+
+
+concurrency_limits = ConcurrencyLimits()
+
+
+# =========================
+# LOGIN THROTTLING
+# =========================
+class TokenBucket:
+    """In-memory token buckets, one per key: `capacity` tokens that refill
+    at capacity / `per` seconds."""
+
+    # full buckets are dropped once there are this many keys
+    MAX_KEYS = 10000
+
+    def __init__(self, capacity, per):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _level(self, key, now):
+        tokens, last = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - last) * self.rate)
+
+    def wait(self, key):
+        """Seconds until `key` has a token; 0 when it has one now."""
+        with self._lock:
+            level = self._level(key, time.monotonic())
+        return 0 if level >= 1 else (1 - level) / self.rate
+
+    def take(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[key] = (max(self._level(key, now) - 1, 0), now)
+            if len(self._buckets) > self.MAX_KEYS:
+                self._buckets = {
+                    k: v for k, v in self._buckets.items()
+                    if self._level(k, now) < self.capacity
+                }
+
+
+class LoginThrottle:
+    """Failed-login limits per client address and per username.
+
+    A client gets LOGIN_FAILURES_PER_IP failed attempts, and a username
+    LOGIN_FAILURES_PER_USER, per LOGIN_FAILURE_WINDOW seconds (refilled
+    continuously). Only failures are counted, so a class logging in from
+    one school address is not throttled, and a throttled attempt is refused
+    before its password is hashed. Behind a reverse proxy set
+    LOGIN_PROXY_HOPS to the number of proxies that append X-Forwarded-For.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.proxy_hops = 0
+        self.by_ip = self.by_user = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        window = app.config.setdefault(
+            "LOGIN_FAILURE_WINDOW", float(os.environ.get("LOGIN_FAILURE_WINDOW", 60))
+        )
+        per_ip = app.config.setdefault(
+            "LOGIN_FAILURES_PER_IP", int(os.environ.get("LOGIN_FAILURES_PER_IP", 30))
+        )
+        per_user = app.config.setdefault(
+            "LOGIN_FAILURES_PER_USER", int(os.environ.get("LOGIN_FAILURES_PER_USER", 5))
+        )
+        self.proxy_hops = app.config.setdefault(
+            "LOGIN_PROXY_HOPS", int(os.environ.get("LOGIN_PROXY_HOPS", 0))
+        )
+
+        self.enabled = bool(per_ip and per_user)
+        if self.enabled:
+            self.by_ip = TokenBucket(per_ip, window)
+            self.by_user = TokenBucket(per_user, window)
+        app.extensions["login_throttle"] = self
+
+    def client(self):
+        if self.proxy_hops:
+            route = request.access_route
+            return route[max(len(route) - self.proxy_hops, 0)]
+        return request.remote_addr
+
+    def retry_after(self, username):
+        """Whole seconds this login attempt must wait; 0 to go ahead."""
+        if not self.enabled:
+            return 0
+        wait = max(self.by_ip.wait(self.client()), self.by_user.wait(username or ""))
+        return math.ceil(wait)
+
+    def failed(self, username):
+        if self.enabled:
+            self.by_ip.take(self.client())
+            self.by_user.take(username or "")
+
+
+login_throttle = LoginThrottle()
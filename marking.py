@@ -0,0 +1,94 @@
+from sqlalchemy import or_
+
+from bitmaps import apply_bitmaps
+from models import db, Attendance, User, status_label, upsert
+from summaries import apply_marks, apply_rollup
+from versions import bump, class_version_key, next_version, student_version_key
+
+STATUSES = ("Present", "Absent")
+
+
+# =========================
+# WRITES
+# =========================
+def normalize_status(status):
+    if not isinstance(status, str):
+        return None
+    status = status.strip().capitalize()
+    return status if status in STATUSES else None
+
+
+def resolve_students(ids=(), usernames=()):
+    """Map student ids and usernames to ids of existing students, in one query.
+
+    Returns (set of ids, {username: id}); anything unknown is left out.
+    """
+    if not ids and not usernames:
+        return set(), {}
+
+    rows = db.session.query(User.id, User.username).filter(
+        User.role == "student",
+        or_(User.id.in_(ids), User.username.in_(usernames))
+    ).all()
+
+    return {i for i, _ in rows}, {name: i for i, name in rows}
+
+
+def record_marks(subject_id, day, statuses, commit=True):
+    """Upsert {student_id: status} for one subject and day in a single transaction.
+
+    Every attendance write goes through here so that anything derived from
+    the attendance table can be kept up to date in the same place. Rows
+    whose status changes get the new "attendance" version as their seq.
+    Pass commit=False to make it part of a larger transaction.
+    """
+    if not statuses:
+        return 0
+
+    # bumping the counter is the transaction's first write, so it takes the
+    # write lock (the counter row's lock on other databases) before
+    # `previous` is read; concurrent writers then fold their deltas into
+    # the summaries, rollup and bitmaps one after another
+    seq = next_version("attendance")
+    previous = {
+        student_id: status_label(present)
+        for student_id, present in db.session.query(
+            Attendance.student_id, Attendance.present
+        ).filter(
+            Attendance.subject_id == subject_id,
+            Attendance.date == day,
+            Attendance.student_id.in_(statuses)
+        )
+    }
+
+    rows = [
+        {
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "present": status == "Present",
+            "date": day,
+            "seq": seq
+        }
+        for student_id, status in statuses.items()
+    ]
+
+    insert = upsert(Attendance)
+    stmt = insert.on_conflict_do_update(
+        index_elements=["student_id", "subject_id", "date"],
+        set_={"present": insert.excluded.present, "seq": insert.excluded.seq},
+        # an unchanged mark keeps its seq, so syncing clients skip it
+        where=Attendance.present != insert.excluded.present
+    )
+
+    db.session.execute(stmt, rows)
+    # before apply_marks, whose streak recompute reads the bitmaps
+    apply_bitmaps(subject_id, day, statuses, previous)
+    apply_marks(subject_id, day, statuses, previous)
+    classes = apply_rollup(subject_id, day, statuses, previous)
+    bump(
+        *(student_version_key(s) for s in statuses if previous.get(s) != statuses[s]),
+        *(class_version_key(*c) for c in classes)
+    )
+    if commit:
+        db.session.commit()
+    return len(rows)
@@ -0,0 +1,246 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from models import db
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+# =========================
+# SAMPLING PROFILER
+# =========================
+class Sampler:
+    """Samples the stacks of request threads from one background thread.
+
+    Only threads between start() and stop() are sampled, and the thread is
+    only started when PROFILE_SLOW_MS is set.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._stacks[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._stacks.pop(ident, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._stacks.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    """frame -> "file:function;file:function;..." outermost first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# =========================
+# METRICS
+# =========================
+class Metrics:
+    """Query counts, DB time and latency per request, exported at /metrics.
+
+    Counters live in each process: behind several gunicorn workers every
+    scrape sees one worker. Config: METRICS_TOKEN (bearer token required by
+    /metrics, which is disabled without one), SERVER_TIMING (add a Server-Timing header; defaults
+    to debug mode), PROFILE_SLOW_MS (dump a sampled profile of requests
+    slower than this into PROFILE_DIR) and PROFILE_INTERVAL_MS.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.requests = Counter()                 # (endpoint, method, status)
+        self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.seconds = Counter()                  # endpoint -> total latency
+        self.count = Counter()                    # endpoint -> requests
+        self.queries = Counter()                  # endpoint -> statements
+        self.db_seconds = Counter()               # endpoint -> time in the DB
+        self.sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_TOKEN", os.environ.get("METRICS_TOKEN"))
+        app.config.setdefault(
+            "SERVER_TIMING", os.environ.get("SERVER_TIMING", "") == "1" or app.debug
+        )
+        slow_ms = app.config.setdefault(
+            "PROFILE_SLOW_MS", int(os.environ.get("PROFILE_SLOW_MS", 0))
+        )
+        interval = app.config.setdefault(
+            "PROFILE_INTERVAL_MS", int(os.environ.get("PROFILE_INTERVAL_MS", 5))
+        )
+        app.config.setdefault(
+            "PROFILE_DIR",
+            os.environ.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+        )
+        if slow_ms:
+            self.sampler = Sampler(interval / 1000)
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, "before_cursor_execute", _before_execute)
+                event.listen(engine, "after_cursor_execute", _after_execute)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        app.extensions["metrics"] = self
+
+    # -------------------------
+    # request hooks
+    # -------------------------
+    def _before_request(self):
+        g._metrics = {"start": time.perf_counter(), "queries": 0, "db": 0.0}
+        if self.sampler is not None:
+            self.sampler.start(threading.get_ident())
+
+    def _after_request(self, response):
+        stats = g.pop("_metrics", None)
+        if stats is None:
+            return response
+
+        elapsed = time.perf_counter() - stats["start"]
+        endpoint = request.endpoint or "unmatched"
+        self.observe(endpoint, request.method, response.status_code, elapsed, stats)
+
+        if self.sampler is not None:
+            stacks = self.sampler.stop(threading.get_ident())
+            if elapsed * 1000 >= current_app.config["PROFILE_SLOW_MS"]:
+                _dump_profile(endpoint, elapsed, stacks)
+
+        if current_app.config["SERVER_TIMING"]:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats["db"] * 1000:.1f};desc="{stats["queries"]} queries", '
+                f"app;dur={elapsed * 1000:.1f}"
+            )
+        return response
+
+    def observe(self, endpoint, method, status, elapsed, stats):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.count[endpoint] += 1
+            self.seconds[endpoint] += elapsed
+            self.queries[endpoint] += stats["queries"]
+            self.db_seconds[endpoint] += stats["db"]
+            buckets = self.buckets[endpoint]
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    buckets[i] += 1
+
+    # -------------------------
+    # exposition
+    # -------------------------
+    def export(self):
+        token = current_app.config["METRICS_TOKEN"]
+        if not token:
+            return "", 404
+        if not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return "", 401
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+    def render(self):
+        """The counters in the Prometheus text format."""
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Requests handled.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(
+                    f'http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                    f'status="{status}"}} {n}'
+                )
+
+            lines += [
+                "# HELP http_request_duration_seconds Request latency.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for endpoint in sorted(self.count):
+                label = f'endpoint="{endpoint}"'
+                for bound, n in zip(BUCKETS, self.buckets[endpoint]):
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{{label},le="{bound}"}} {n}'
+                    )
+                lines += [
+                    f'http_request_duration_seconds_bucket{{{label},le="+Inf"}} '
+                    f"{self.count[endpoint]}",
+                    f"http_request_duration_seconds_sum{{{label}}} "
+                    f"{self.seconds[endpoint]:.6f}",
+                    f"http_request_duration_seconds_count{{{label}}} "
+                    f"{self.count[endpoint]}",
+                ]
+
+            for name, kind, help_text, values, fmt in (
+                ("db_queries_total", "counter",
+                 "SQL statements executed while handling requests.", self.queries, "d"),
+                ("db_query_duration_seconds_total", "counter",
+                 "Time spent in SQL statements while handling requests.",
+                 self.db_seconds, ".6f"),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for endpoint in sorted(values):
+                    lines.append(
+                        f'{name}{{endpoint="{endpoint}"}} {values[endpoint]:{fmt}}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+# =========================
+# SQL HOOKS
+# =========================
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["_metrics_start"] = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("_metrics_start", None)
+    stats = g.get("_metrics") if has_app_context() else None
+    if stats is not None and started is not None:
+        stats["queries"] += 1
+        stats["db"] += time.perf_counter() - started
+
+
+def _dump_profile(endpoint, elapsed, stacks):
+    """Write collapsed stacks (flamegraph.pl / speedscope input)."""
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms.txt"
+    with open(os.path.join(directory, name), "w") as f:
+        for stack, n in stacks.most_common():
+            f.write(f"{stack} {n}\n")
+
+
+metrics = Metrics()
@@ -0,0 +1,178 @@
+from sqlalchemy import delete, func, inspect, select, text
+
+from models import (
+    db, Attendance, AttendanceBitmap, AttendanceSummary, DailyRollup, Subject
+)
+from summaries import rebuild_summaries
+from versions import bump
+
+LEGACY_TABLE = "attendance_legacy"
+
+# tables of the string-keyed schema, and a column only that layout has;
+# migrate_string_attendance replaces them rather than altering them
+LEGACY_LAYOUT = {"attendance": "student", "attendance_summary": "student"}
+
+DEFAULT_SUBJECTS = ("Python", "Java", "MIC", "ES", "DCN")
+
+
+# =========================
+# BOOTSTRAP
+# =========================
+def bootstrap():
+    """Create missing tables, columns and indexes and the default subjects,
+    and backfill derived tables added since the last deploy; a few cheap
+    queries when there is nothing to do. A database still on the string
+    schema is migrated first. Returns the names of the subjects added."""
+    migrate_string_attendance()
+    db.create_all()
+    add_missing_columns()
+    create_missing_indexes()
+    if derived_tables_empty():
+        rebuild_summaries()
+    existing = {name for (name,) in db.session.query(Subject.name)}
+    missing = [name for name in DEFAULT_SUBJECTS if name not in existing]
+    if missing:
+        db.session.add_all(Subject(name=name) for name in missing)
+        bump("subjects")
+    db.session.commit()
+    return missing
+
+
+# =========================
+# SCHEMA UPGRADE
+# =========================
+def _columns(table):
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table):
+        return set()
+    return {c["name"] for c in inspector.get_columns(table)}
+
+
+def migrate_string_attendance():
+    """Move the old string-keyed attendance rows to the id-keyed table.
+
+    The old table is kept as attendance_legacy. Rows whose student or
+    subject no longer exists cannot be mapped and stay only there.
+    Returns (migrated, unmapped), or None if there was nothing to migrate.
+    """
+    if "student" not in _columns(Attendance.__tablename__):
+        return None
+
+    # index names are global in SQLite; free them for the new table
+    for index in Attendance.__table__.indexes:
+        db.session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    db.session.execute(text(f"ALTER TABLE attendance RENAME TO {LEGACY_TABLE}"))
+
+    # summaries are derived data; the rebuild below refills them
+    if "student" in _columns(AttendanceSummary.__tablename__):
+        db.session.execute(text("DROP TABLE attendance_summary"))
+    db.session.commit()
+
+    db.create_all()
+
+    migrated = db.session.execute(text(f"""
+        INSERT INTO attendance (student_id, subject_id, present, date)
+        SELECT u.id, s.id, l.status = 'Present', l.date
+        FROM {LEGACY_TABLE} l
+        JOIN "user" u ON u.username = l.student
+        JOIN subject s ON s.name = l.subject
+        WHERE l.id IN (
+            SELECT max(id) FROM {LEGACY_TABLE}
+            GROUP BY student, subject, date
+        )
+    """)).rowcount
+    legacy = db.session.execute(text(
+        f"SELECT count(DISTINCT student || '|' || subject || '|' || date) FROM {LEGACY_TABLE}"
+    )).scalar()
+    db.session.commit()
+
+    return migrated, legacy - migrated
+
+
+def dedupe_attendance():
+    """Keep only the newest row for each (student, subject, date)."""
+    newest = (
+        select(func.max(Attendance.id))
+        .group_by(Attendance.student_id, Attendance.subject_id, Attendance.date)
+    )
+    result = db.session.execute(
+        delete(Attendance).where(Attendance.id.not_in(newest))
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def add_missing_columns():
+    """Add every column declared on the models that an existing table lacks.
+
+    Only columns with a server default (or nullable ones) can be added this
+    way; existing rows take the default. Tables still in the string-keyed
+    layout are left alone.
+    """
+    inspector = inspect(db.engine)
+    added = []
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        if LEGACY_LAYOUT.get(table.name) in existing:
+            continue
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"{column.name} {column.type.compile(db.engine.dialect)}"
+            if column.server_default is not None:
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                ddl += f" DEFAULT {column.server_default.arg}"
+            db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+            added.append(f"{table.name}.{column.name}")
+
+    db.session.commit()
+    return added
+
+
+def create_missing_indexes():
+    """Create every index declared on the models that the database lacks."""
+    inspector = inspect(db.engine)
+    created = []
+
+    for table in db.metadata.sorted_tables:
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+
+    return created
+
+
+def derived_tables_empty():
+    """True when there are marks but a summary, rollup or bitmap table is
+    empty, as it is right after being created."""
+    return db.session.query(Attendance.id).first() is not None and any(
+        db.session.query(column).first() is None
+        for column in (
+            AttendanceSummary.student_id, DailyRollup.date, AttendanceBitmap.student_id
+        )
+    )
+
+
+def upgrade():
+    """Bring an existing database up to the current models, in place.
+
+    Returns a dict describing what was changed.
+    """
+    result = {"migrated": migrate_string_attendance()}
+
+    db.create_all()
+    result["columns"] = add_missing_columns()
+    result["removed"] = dedupe_attendance()
+    result["created"] = create_missing_indexes()
+
+    # freshly created summary/rollup tables start empty; backfill them once
+    if derived_tables_empty() or result["removed"]:
+        rebuild_summaries()
+
+    return result
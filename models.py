@@ -0,0 +1,153 @@
+from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+_UPSERT_DIALECTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def upsert(model):
+    """An INSERT that supports .on_conflict_do_update() on the current database."""
+    return _UPSERT_DIALECTS[db.engine.dialect.name](model)
+
+# =========================
+# MODELS
+# =========================
+class Subject(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+
+
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+
+    year = db.Column(db.String(10))
+    division = db.Column(db.String(5))
+    phone = db.Column(db.String(20))
+    is_active = db.Column(db.Boolean, default=True)
+
+    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"))
+
+    __table_args__ = (
+        db.Index("ix_user_role_year_division", "role", "year", "division"),
+    )
+
+
+class Attendance(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
+    present = db.Column(db.Boolean, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    # the "attendance" version of the write that last changed the row;
+    # delta sync hands out rows above a client's last seen value
+    seq = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    student_user = db.relationship("User")
+    subject_obj = db.relationship("Subject")
+
+    __table_args__ = (
+        # one mark per student, subject and day; also serves (student, subject)
+        db.Index(
+            "uq_attendance_student_subject_date",
+            "student_id", "subject_id", "date",
+            unique=True
+        ),
+        db.Index("ix_attendance_student_date", "student_id", "date"),
+        db.Index("ix_attendance_date", "date"),
+        db.Index("ix_attendance_student_seq", "student_id", "seq"),
+        db.Index("ix_attendance_subject_seq", "subject_id", "seq"),
+    )
+
+    # read-only names for templates and JSON written against the old
+    # string columns
+    @property
+    def student(self):
+        return self.student_user.username if self.student_user else None
+
+    @property
+    def subject(self):
+        return self.subject_obj.name if self.subject_obj else None
+
+    @property
+    def status(self):
+        return status_label(self.present)
+
+
+def status_label(present):
+    return "Present" if present else "Absent"
+
+
+class AttendanceSummary(db.Model):
+    """Running counters per student and subject, kept in step by marking.py.
+
+    The row with subject_id == ALL_SUBJECTS holds the student's overall totals.
+    """
+    student_id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    # streak counts "Present" marks dated after the latest "Absent" one
+    streak = db.Column(db.Integer, nullable=False, default=0)
+    last_date = db.Column(db.Date)
+    last_absent = db.Column(db.Date)
+
+
+ALL_SUBJECTS = 0
+
+
+class DailyRollup(db.Model):
+    """Marks per day, subject and class, kept in step by marking.py.
+
+    year and division are the student's class when the mark was written,
+    "" when unset; the key order serves "one subject on one day" lookups.
+    """
+    date = db.Column(db.Date, primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.String(10), primary_key=True)
+    division = db.Column(db.String(5), primary_key=True)
+
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AttendanceBitmap(db.Model):
+    """A student's marks in one subject over one calendar year, one bit per
+    day (bit n is day n + 1 of the year), kept in step by marking.py.
+
+    `marked` has a bit for every day with a mark, `present` for every day
+    marked present; see bitmaps.py.
+    """
+    student_id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+
+    present = db.Column(db.LargeBinary, nullable=False)
+    marked = db.Column(db.LargeBinary, nullable=False)
+
+
+class DataVersion(db.Model):
+    """Counters bumped whenever the data they name changes; see versions.py."""
+    name = db.Column(db.String(80), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SyncReceipt(db.Model):
+    """An offline mark already processed, by the uploader's idempotency key."""
+    user_id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    result = db.Column(db.String(20), nullable=False)
+    created = db.Column(db.DateTime, nullable=False)
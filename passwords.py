@@ -0,0 +1,87 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# werkzeug's default; scrypt needs 128 * n * r bytes (32 MiB) per hash
+DEFAULT_METHOD = "scrypt:32768:8:1"
+
+
+# =========================
+# PASSWORD HASHING
+# =========================
+class Passwords:
+    """Password hashing with configurable cost and bounded verification.
+
+    PASSWORD_HASH_METHOD is any werkzeug method string ("scrypt:n:r:p",
+    "pbkdf2:sha256:iterations"); hashes written with other parameters are
+    replaced on the user's next successful login. Verifications run on a
+    pool of PASSWORD_VERIFY_WORKERS threads (hashlib releases the GIL), so
+    a login burst on a threaded server queues for CPU instead of running
+    dozens of scrypt hashes, and their memory, at once.
+    """
+
+    def __init__(self, app=None):
+        self.method = DEFAULT_METHOD
+        self.workers = os.cpu_count() or 1
+        self._prefix = None
+        self._pool = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.setdefault(
+            "PASSWORD_HASH_METHOD",
+            os.environ.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD)
+        )
+        self.workers = app.config.setdefault(
+            "PASSWORD_VERIFY_WORKERS",
+            int(os.environ.get("PASSWORD_VERIFY_WORKERS", os.cpu_count() or 1))
+        )
+        self._prefix = None
+        app.extensions["passwords"] = self
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def hasher(self):
+        """A picklable hash function, for process pools."""
+        return partial(generate_password_hash, method=self.method)
+
+    def verify(self, hashed, password):
+        """check_password_hash on the verification pool."""
+        return self._run(check_password_hash, hashed, password)
+
+    def _run(self, fn, *args):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="password"
+                    )
+        return self._pool.submit(fn, *args).result()
+
+    def needs_rehash(self, hashed):
+        """True when `hashed` was written with other parameters."""
+        if self._prefix is None:
+            # "scrypt" is stored as "scrypt:32768:8:1"; let werkzeug expand it
+            self._prefix = self.hash("").split("$", 1)[0]
+        return hashed.split("$", 1)[0] != self._prefix
+
+    def check(self, user, password):
+        """Verify `user`'s password, upgrading its hash when it is outdated.
+
+        The caller commits; the new hash only costs a write on the first
+        login after PASSWORD_HASH_METHOD changes.
+        """
+        if not password or not self.verify(user.password, password):
+            return False
+        if self.needs_rehash(user.password):
+            user.password = self._run(self.hash, password)
+        return True
+
+
+passwords = Passwords()
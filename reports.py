@@ -0,0 +1,176 @@
+from archive import archives
+from bitmaps import marks_between
+from models import (
+    db, Subject, User, AttendanceSummary, DailyRollup,
+    ALL_SUBJECTS, status_label
+)
+
+
+# =========================
+# AGGREGATES
+# =========================
+def attendance_counts(student_ids=None, subject_id=None):
+    """Present/total counts per (student_id, subject_id), read from the summaries."""
+    query = db.session.query(
+        AttendanceSummary.student_id,
+        AttendanceSummary.subject_id,
+        AttendanceSummary.present,
+        AttendanceSummary.total
+    ).filter(AttendanceSummary.subject_id != ALL_SUBJECTS)
+
+    if student_ids is not None:
+        query = query.filter(AttendanceSummary.student_id.in_(student_ids))
+    if subject_id is not None:
+        query = query.filter(AttendanceSummary.subject_id == subject_id)
+
+    return {
+        (student, sub): (present, total)
+        for student, sub, present, total in query
+    }
+
+
+def percent(present, total):
+    return round((present / total) * 100, 2) if total else None
+
+
+# =========================
+# CC REPORT
+# =========================
+def cc_report_data():
+    """Return (subjects, rows) for every student, with raw counts per subject.
+
+    Costs three queries regardless of the number of students or the length
+    of their history: subjects, students and the counters above.
+    """
+    subjects = db.session.query(Subject.id, Subject.name).order_by(Subject.id).all()
+    students = (
+        db.session.query(User.id, User.username)
+        .filter_by(role="student")
+        .order_by(User.id)
+        .all()
+    )
+    counts = attendance_counts()
+
+    rows = []
+    for student_id, username in students:
+        per_subject = {}
+        present_sum = 0
+        total_sum = 0
+
+        for subject_id, sub in subjects:
+            present, total = counts.get((student_id, subject_id), (0, 0))
+            per_subject[sub] = (present, total)
+            present_sum += present
+            total_sum += total
+
+        rows.append({
+            "student": username,
+            "subjects": per_subject,
+            "present": present_sum,
+            "total": total_sum
+        })
+
+    return [name for _, name in subjects], rows
+
+
+def generate_cc_report(academic_year=None):
+    """Percentages per subject plus overall, as rendered on /cc and in the PDF.
+
+    An archived academic year is read from its archive instead; raises
+    ValueError if that year is not archived.
+    """
+    if academic_year is None:
+        subjects, rows = cc_report_data()
+    else:
+        subjects, rows = archives.cc_report_data(academic_year)
+    report = []
+
+    for r in rows:
+        row = {"student": r["student"]}
+        for sub in subjects:
+            row[sub] = percent(*r["subjects"][sub])
+        row["total"] = percent(r["present"], r["total"])
+        report.append(row)
+
+    return report
+
+
+# =========================
+# TEACHER REPORTS
+# =========================
+def daily_summary(day, subject_id):
+    """Marks recorded on `day` in one subject, per class and in total.
+
+    Read from the daily rollup: a single primary-key range lookup, however
+    large the institution.
+    """
+    classes = [
+        {
+            "year": year, "division": division,
+            "present": present, "absent": absent, "total": total
+        }
+        for year, division, present, absent, total in db.session.query(
+            DailyRollup.year,
+            DailyRollup.division,
+            DailyRollup.present,
+            DailyRollup.absent,
+            DailyRollup.total
+        ).filter(
+            DailyRollup.date == day,
+            DailyRollup.subject_id == subject_id
+        ).order_by(DailyRollup.year, DailyRollup.division)
+    ]
+
+    return {
+        "total": sum(c["total"] for c in classes),
+        "present": sum(c["present"] for c in classes),
+        "absent": sum(c["absent"] for c in classes),
+        "classes": classes
+    }
+
+
+def monthly_report(subject_id, year, division, start, end):
+    """Per-student counts and marks for one subject in one class, between
+    `start` and `end` inclusive.
+
+    Two queries whatever the class size: the students, then their bitmaps
+    for the subject, from which the counts and day-level marks are read
+    with bit operations. Returns (report, class_average); records are
+    plain dicts so the result can be cached.
+    """
+    students = (
+        db.session.query(User.id, User.username)
+        .filter_by(role="student", year=year, division=division)
+        .order_by(User.id)
+        .all()
+    )
+    marks = marks_between([s for s, _ in students], subject_id, start, end)
+    counts = {s: (present, total) for s, (present, total, _) in marks.items()}
+    records = {
+        s: [{"date": day, "status": status_label(present)} for day, present in days]
+        for s, (_, _, days) in marks.items()
+    }
+
+    report = []
+    total_percent = 0
+    count = 0
+
+    for student_id, username in students:
+        present, total = counts.get(student_id, (0, 0))
+        percent = round((present / total) * 100, 2) if total else 0
+
+        if total:
+            total_percent += percent
+            count += 1
+
+        report.append({
+            "student": username,
+            "present": present,
+            "absent": total - present,
+            "total": total,
+            "percentage": percent,
+            "records": records.get(student_id, [])
+        })
+
+    class_average = round(total_percent / count, 2) if count else 0
+    return report, class_average
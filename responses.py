@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import json
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from versions import current
+
+COMPRESSIBLE = ("text/html", "application/json", "text/plain", "text/csv")
+
+
+# =========================
+# CONDITIONAL GET
+# =========================
+def etag_salt():
+    """Part of every ETag; set ETAG_SALT to the release on deploy so pages
+    cached by clients are not revalidated across a code change."""
+    return (
+        current_app.config.get("ETAG_SALT")
+        or os.environ.get("ETAG_SALT")
+        or os.environ.get("RENDER_GIT_COMMIT", "")
+    )
+
+
+def versioned(depends, vary=None):
+    """Decorator for GET views whose body is determined by data versions.
+
+    `depends()` returns the version names the response is built from (or
+    None to skip, e.g. for a caller that will be refused). The weak ETag
+    is derived from those versions, the URL and ETAG_SALT, so a matching
+    If-None-Match is answered 304 after one versions lookup, before the
+    view runs. `vary()` returns whatever else the body depends on that the
+    URL does not show, such as the month a view defaults to.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            names = depends()
+            if names is None:
+                return view(*args, **kwargs)
+
+            tag = hashlib.sha1(json.dumps([
+                etag_salt(),
+                request.full_path,
+                names,
+                current(*names),
+                vary() if vary else None
+            ], default=str).encode()).hexdigest()[:24]
+
+            if request.if_none_match.contains_weak(tag):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(tag, weak=True)
+            # private: the body belongs to the signed-in user; no-cache:
+            # always revalidate, which is what makes it cheap
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapped
+    return decorator
+
+
+# =========================
+# COMPRESSION
+# =========================
+class Compression:
+    """gzip (or brotli, when the module is installed) for text responses.
+
+    Config: COMPRESS_MIN_SIZE (bytes) and COMPRESS_LEVEL. Streamed and
+    file responses, and anything already encoded, are left alone.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.level = 6
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.setdefault(
+            "COMPRESS_MIN_SIZE", int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+        )
+        self.level = app.config.setdefault(
+            "COMPRESS_LEVEL", int(os.environ.get("COMPRESS_LEVEL", 6))
+        )
+        app.after_request(self._compress)
+        app.extensions["compression"] = self
+
+    def _compress(self, response):
+        response.vary.add("Accept-Encoding")
+
+        if response.status_code != 200 or response.direct_passthrough \
+                or response.is_streamed \
+                or "Content-Encoding" in response.headers \
+                or response.mimetype not in COMPRESSIBLE:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        encoding = self._choose(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if encoding == "br":
+            import brotli
+            data = brotli.compress(data, quality=min(self.level, 11))
+        else:
+            data = gzip.compress(data, compresslevel=self.level)
+
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _choose(accepted):
+        if accepted["br"]:
+            try:
+                import brotli  # noqa: F401
+                return "br"
+            except ImportError:
+                pass
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+
+compression = Compression()
@@ -0,0 +1,247 @@
+from collections import defaultdict
+
+from sqlalchemy import and_, case, delete, func, insert, literal, select
+
+from bitmaps import rebuild_bitmaps, streak
+
+from models import (
+    db, Attendance, AttendanceSummary, DailyRollup, Subject, User,
+    ALL_SUBJECTS, upsert
+)
+
+ROLLUP_COUNTERS = ("present", "absent", "total")
+
+
+# =========================
+# READS
+# =========================
+def _blank(student_id, subject_id):
+    return AttendanceSummary(
+        student_id=student_id, subject_id=subject_id,
+        present=0, absent=0, total=0, streak=0
+    )
+
+
+def get_summary(student_id, subject_id=ALL_SUBJECTS):
+    """Counters for a student (overall, or for one subject), never None."""
+    return (
+        db.session.get(AttendanceSummary, (student_id, subject_id))
+        or _blank(student_id, subject_id)
+    )
+
+
+def get_summaries(student_ids, subject_id=ALL_SUBJECTS):
+    """Counters for many students in one query, keyed by student id."""
+    found = {
+        r.student_id: r for r in AttendanceSummary.query.filter(
+            AttendanceSummary.subject_id == subject_id,
+            AttendanceSummary.student_id.in_(student_ids)
+        )
+    }
+    return {s: found.get(s) or _blank(s, subject_id) for s in student_ids}
+
+
+def get_subject_summaries(student_id):
+    """[(subject name, counters)] for every subject the student has marks in."""
+    return (
+        db.session.query(Subject.name, AttendanceSummary)
+        .join(Subject, Subject.id == AttendanceSummary.subject_id)
+        .filter(AttendanceSummary.student_id == student_id)
+        .order_by(Subject.id)
+        .all()
+    )
+
+
+# =========================
+# INCREMENTAL UPDATES
+# =========================
+def apply_marks(subject_id, day, statuses, previous):
+    """Fold one batch of marks into the summaries of the students involved.
+
+    `statuses` and `previous` map student id -> "Present"/"Absent"; previous
+    holds what was stored for (subject, day) before the batch was written.
+    Must run in the same transaction as the attendance write.
+    """
+    keys = [(s, sub) for s in statuses for sub in (subject_id, ALL_SUBJECTS)]
+    summaries = {
+        (r.student_id, r.subject_id): r
+        for r in AttendanceSummary.query.filter(
+            AttendanceSummary.student_id.in_(statuses),
+            AttendanceSummary.subject_id.in_([subject_id, ALL_SUBJECTS])
+        )
+    }
+
+    stale = []
+    for student, sub in keys:
+        old = previous.get(student)
+        new = statuses[student]
+        if old == new:
+            continue
+
+        summary = summaries.get((student, sub))
+        if summary is None:
+            summary = summaries[(student, sub)] = _blank(student, sub)
+            db.session.add(summary)
+
+        if not _apply(summary, day, old, new):
+            stale.append(summary)
+
+    for summary in stale:
+        _recompute_streak(summary)
+
+
+def _apply(summary, day, old, new):
+    """Update counters in place; False if the streak needs recomputing."""
+    if old is None:
+        summary.total += 1
+    else:
+        setattr(summary, old.lower(), getattr(summary, old.lower()) - 1)
+    setattr(summary, new.lower(), getattr(summary, new.lower()) + 1)
+
+    # only a brand-new mark on the latest day can extend or break the streak
+    if old is not None or (summary.last_date and day < summary.last_date):
+        return False
+
+    summary.last_date = day
+    if new == "Absent":
+        summary.streak = 0
+        summary.last_absent = day
+    elif summary.last_absent != day:
+        summary.streak += 1
+    return True
+
+
+def _recompute_streak(summary):
+    """Recount from the bitmaps, which apply_bitmaps has already updated."""
+    summary.streak, summary.last_date, summary.last_absent = streak(
+        summary.student_id, summary.subject_id
+    )
+
+
+def apply_rollup(subject_id, day, statuses, previous):
+    """Fold one batch of marks into the day's per-class counters.
+
+    Same arguments as apply_marks; one upsert adds the deltas per class.
+    Returns the (year, division) classes that changed.
+    """
+    changed = [s for s in statuses if previous.get(s) != statuses[s]]
+    if not changed:
+        return set()
+
+    deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_COUNTERS, 0))
+    for student, year, division in db.session.query(
+        User.id, User.year, User.division
+    ).filter(User.id.in_(changed)):
+        delta = deltas[(year or "", division or "")]
+        old = previous.get(student)
+        if old is None:
+            delta["total"] += 1
+        else:
+            delta[old.lower()] -= 1
+        delta[statuses[student].lower()] += 1
+
+    if not deltas:
+        return set()
+
+    insert_rollup = upsert(DailyRollup)
+    stmt = insert_rollup.on_conflict_do_update(
+        index_elements=["date", "subject_id", "year", "division"],
+        set_={
+            c: getattr(DailyRollup, c) + getattr(insert_rollup.excluded, c)
+            for c in ROLLUP_COUNTERS
+        }
+    )
+    db.session.execute(stmt, [
+        {"date": day, "subject_id": subject_id, "year": year, "division": division,
+         **delta}
+        for (year, division), delta in deltas.items()
+    ])
+    return set(deltas)
+
+
+# =========================
+# REBUILD
+# =========================
+def _aggregate(group_cols):
+    """One row of counters per group, computed from the attendance table."""
+    absences = (
+        select(*group_cols, func.max(Attendance.date).label("last_absent"))
+        .where(Attendance.present.is_(False))
+        .group_by(*group_cols)
+        .subquery()
+    )
+    last_absent = absences.c.last_absent
+    present = Attendance.present.is_(True)
+
+    return (
+        select(
+            Attendance.student_id,
+            group_cols[1] if len(group_cols) > 1 else literal(ALL_SUBJECTS),
+            func.sum(case((present, 1), else_=0)),
+            func.sum(case((present, 0), else_=1)),
+            func.count(Attendance.id),
+            func.sum(case(
+                (and_(present, last_absent.is_(None)), 1),
+                (and_(present, Attendance.date > last_absent), 1),
+                else_=0
+            )),
+            func.max(Attendance.date),
+            last_absent
+        )
+        .select_from(Attendance)
+        .outerjoin(absences, and_(*(c == absences.c[c.key] for c in group_cols)))
+        .group_by(*group_cols, last_absent)
+    )
+
+
+def rebuild_summaries(batch=10000):
+    """Recompute every summary row, the daily rollup and the bitmaps from scratch."""
+    db.session.execute(delete(AttendanceSummary))
+
+    columns = [
+        "student_id", "subject_id", "present", "absent",
+        "total", "streak", "last_date", "last_absent"
+    ]
+    written = 0
+
+    for group_cols in (
+        [Attendance.student_id, Attendance.subject_id],
+        [Attendance.student_id],
+    ):
+        rows = db.session.execute(_aggregate(group_cols)).all()
+        for i in range(0, len(rows), batch):
+            db.session.execute(
+                insert(AttendanceSummary),
+                [dict(zip(columns, r)) for r in rows[i:i + batch]]
+            )
+        written += len(rows)
+
+    written += _rebuild_rollups()
+    written += rebuild_bitmaps()
+    db.session.commit()
+    return written
+
+
+def _rebuild_rollups():
+    """Refill the daily rollup with one INSERT ... SELECT."""
+    db.session.execute(delete(DailyRollup))
+    present = Attendance.present.is_(True)
+    year = func.coalesce(User.year, "")
+    division = func.coalesce(User.division, "")
+
+    return db.session.execute(
+        insert(DailyRollup).from_select(
+            ["date", "subject_id", "year", "division", *ROLLUP_COUNTERS],
+            select(
+                Attendance.date,
+                Attendance.subject_id,
+                year,
+                division,
+                func.sum(case((present, 1), else_=0)),
+                func.sum(case((present, 0), else_=1)),
+                func.count(Attendance.id)
+            )
+            .join(User, User.id == Attendance.student_id)
+            .group_by(Attendance.date, Attendance.subject_id, year, division)
+        )
+    ).rowcount
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, tuple_
+
+from archive import archives
+from marking import normalize_status, record_marks, resolve_students
+from models import db, Attendance, Subject, SyncReceipt, User, status_label
+from versions import bump
+
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+# marks in one offline upload
+MAX_UPLOAD = 1000
+
+# receipts older than this are dropped; a client retrying later than this
+# has its marks compared against the server again
+RECEIPT_DAYS = 30
+
+
+# =========================
+# DELTA SYNC
+# =========================
+def encode_token(seq, row_id):
+    return f"{seq}.{row_id}"
+
+
+def decode_token(token):
+    """(seq, id) from a sync token; "" or "0" start from the beginning.
+    Raises ValueError on anything malformed."""
+    seq, _, row_id = (token or "0").partition(".")
+    return int(seq), int(row_id or 0)
+
+
+def changes_since(token, limit=PAGE_SIZE, student_id=None, subject_id=None,
+                  year=None, division=None):
+    """Marks written after `token`, oldest change first.
+
+    Rows are keyed on (seq, id), so a page is a range scan of the
+    (student_id, seq) or (subject_id, seq) index. Returns (records, token,
+    more): store token and pass it next time; while more is True there are
+    further changes to fetch right away.
+    """
+    query = (
+        db.session.query(
+            Attendance.id,
+            Attendance.seq,
+            Attendance.date,
+            Attendance.present,
+            User.username,
+            Subject.name.label("subject")
+        )
+        .join(User, User.id == Attendance.student_id)
+        .join(Subject, Subject.id == Attendance.subject_id)
+        .filter(tuple_(Attendance.seq, Attendance.id) > decode_token(token))
+        .order_by(Attendance.seq, Attendance.id)
+    )
+    if student_id is not None:
+        query = query.filter(Attendance.student_id == student_id)
+    if subject_id is not None:
+        query = query.filter(Attendance.subject_id == subject_id)
+    if year:
+        query = query.filter(User.year == year)
+    if division:
+        query = query.filter(User.division == division)
+
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    records = [
+        {
+            "id": r.id,
+            "seq": r.seq,
+            "student": r.username,
+            "subject": r.subject,
+            "date": r.date.isoformat(),
+            "status": status_label(r.present)
+        }
+        for r in rows
+    ]
+    next_token = encode_token(rows[-1].seq, rows[-1].id) if rows else (token or "0")
+    return records, next_token, more
+
+
+# =========================
+# OFFLINE UPLOADS
+# =========================
+def _validate(mark, today, archived):
+    """(key, username, day, status, base) or an error message."""
+    key = str(mark.get("key") or "")
+    if not key or len(key) > 64:
+        return "Missing or over-long idempotency key"
+
+    status = normalize_status(mark.get("status"))
+    if status is None:
+        return "Status must be Present or Absent"
+
+    if not isinstance(mark.get("date"), str):
+        return "Invalid date"
+    try:
+        day = date.fromisoformat(mark["date"])
+        base = decode_token(str(mark.get("base") or ""))[0] if mark.get("base") else None
+    except ValueError:
+        return "Invalid date or base"
+    if day > today:
+        return "Date is in the future"
+    if archives.year_of(day) in archived:
+        return "Date is in an archived academic year"
+
+    return key, str(mark.get("student") or ""), day, status, base
+
+
+def apply_offline_marks(user_id, subject_id, marks):
+    """Apply a batch of marks captured offline, in one transaction.
+
+    Each mark is {"key", "student", "date", "status", "base"}: key is the
+    client's idempotency key, base the sync token the client held when the
+    mark was taken. A mark whose row changed on the server after base, to
+    a different status, is a conflict and the server's mark is kept;
+    without base the upload wins. Marks already uploaded under the same key
+    are not applied again and report their first result.
+
+    Returns one {"key", "result", ...} per mark, in order; result is
+    applied, unchanged, conflict, invalid or duplicate.
+    """
+    today = date.today()
+    archived = set(archives.years())
+    results = [None] * len(marks)
+    valid = {}
+
+    for i, mark in enumerate(marks):
+        checked = _validate(mark, today, archived)
+        if isinstance(checked, str):
+            results[i] = {"key": mark.get("key"), "result": "invalid", "message": checked}
+        else:
+            valid[i] = checked
+
+    # take the write lock before reading receipts and current marks, as
+    # record_marks does, so a concurrent upload cannot change them under us
+    bump("attendance")
+    seen = {
+        key: result for key, result in db.session.query(
+            SyncReceipt.key, SyncReceipt.result
+        ).filter(
+            SyncReceipt.user_id == user_id,
+            SyncReceipt.key.in_({v[0] for v in valid.values()})
+        )
+    }
+    _, students = resolve_students(usernames={v[1] for v in valid.values()})
+    current = {
+        (student_id, day): (status_label(present), seq)
+        for student_id, day, present, seq in db.session.query(
+            Attendance.student_id, Attendance.date, Attendance.present, Attendance.seq
+        ).filter(
+            Attendance.subject_id == subject_id,
+            Attendance.student_id.in_(students.values()),
+            Attendance.date.in_({v[2] for v in valid.values()})
+        )
+    } if students else {}
+
+    writes = defaultdict(dict)      # day -> {student_id: status}
+    receipts = {}
+    for i, (key, username, day, status, base) in valid.items():
+        if key in seen or key in receipts:
+            results[i] = {"key": key, "result": "duplicate",
+                          "first_result": seen.get(key) or receipts[key]}
+            continue
+
+        student_id = students.get(username)
+        if student_id is None:
+            result = {"key": key, "result": "invalid", "message": "Unknown student"}
+        else:
+            server_status, server_seq = current.get((student_id, day), (None, 0))
+            if server_status == status:
+                result = {"key": key, "result": "unchanged"}
+            elif server_status is not None and base is not None and server_seq > base:
+                result = {"key": key, "result": "conflict",
+                          "server": {"status": server_status, "seq": server_seq}}
+            else:
+                writes[day][student_id] = status
+                result = {"key": key, "result": "applied"}
+
+        results[i] = result
+        receipts[key] = result["result"]
+
+    for day, statuses in sorted(writes.items()):
+        record_marks(subject_id, day, statuses, commit=False)
+
+    now = datetime.utcnow()
+    db.session.add_all(
+        SyncReceipt(user_id=user_id, key=key, result=result, created=now)
+        for key, result in receipts.items()
+    )
+    db.session.execute(delete(SyncReceipt).where(
+        SyncReceipt.user_id == user_id,
+        SyncReceipt.created < now - timedelta(days=RECEIPT_DAYS)
+    ))
+    db.session.commit()
+    return results
@@ -0,0 +1,319 @@
+import csv
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from identity import subject_cache
+from models import db, User
+from passwords import passwords as password_hasher
+from versions import bump
+
+ROLES = ("admin", "teacher", "cc", "student")
+
+IMPORT_COLUMNS = ("username", "password", "role", "year", "division", "phone", "subject")
+IMPORT_BATCH = 500
+
+# below this many passwords starting a process pool costs more than it saves
+POOL_THRESHOLD = 50
+
+# stays under SQLite's limit on bound parameters per statement
+IN_CHUNK = 10000
+
+# largest CSV the web form accepts (roughly 10,000 users, which take a few
+# minutes to hash); bigger files go through `flask import-users`
+MAX_IMPORT_BYTES = 512 * 1024
+
+# an import "pending" this long is assumed to have died with its worker
+IMPORT_TIMEOUT = 3600
+
+# finished imports are kept this long for the status page
+IMPORT_KEEP = 24 * 3600
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="user-import")
+
+
+# =========================
+# USER DIRECTORY
+# =========================
+def filter_users(role=None, year=None, division=None, prefix=None):
+    """Users matching every given filter; all of them use an index."""
+    query = User.query
+
+    if role:
+        query = query.filter(User.role == role)
+    if year:
+        query = query.filter(User.year == year)
+    if division:
+        query = query.filter(User.division == division)
+    if prefix:
+        # a range instead of LIKE so the unique username index is used
+        query = query.filter(
+            User.username >= prefix,
+            User.username < prefix + "\uffff"
+        )
+
+    return query
+
+
+def user_page(query, after=None, before=None, per_page=10):
+    """One keyset page of `query` ordered by id.
+
+    Returns (users, prev_id, next_id): pass next_id back as `after` or
+    prev_id as `before` to move one page; either is None at that end.
+    """
+    if before:
+        rows = (
+            query.filter(User.id < before)
+            .order_by(User.id.desc())
+            .limit(per_page + 1)
+            .all()
+        )
+        more_before = len(rows) > per_page
+        users = rows[:per_page][::-1]
+        more_after = True
+    else:
+        if after:
+            query = query.filter(User.id > after)
+        rows = query.order_by(User.id).limit(per_page + 1).all()
+        more_after = len(rows) > per_page
+        users = rows[:per_page]
+        more_before = bool(after)
+
+    if not users:
+        return users, None, None
+
+    return (
+        users,
+        users[0].id if more_before else None,
+        users[-1].id if more_after else None
+    )
+
+
+def count_users(query):
+    return query.order_by(None).with_entities(db.func.count(User.id)).scalar()
+
+
+# =========================
+# BULK IMPORT
+# =========================
+def read_import(stream):
+    """Validate a users CSV (IMPORT_COLUMNS; username and password required,
+    role defaults to student, subject is a subject name for teachers).
+
+    Returns (rows ready to insert, errors as (line, message)).
+    """
+    reader = csv.DictReader(stream)
+    missing = {"username", "password"} - set(reader.fieldnames or ())
+    if missing:
+        return [], [(1, "Missing column(s): " + ", ".join(sorted(missing)))]
+
+    subjects = {s.name: s.id for s in subject_cache.all()}
+    rows, errors, seen = [], [], set()
+
+    for line, record in enumerate(reader, start=2):
+        def field(name):
+            return (record.get(name) or "").strip()
+
+        username = field("username")
+        role = field("role").lower() or "student"
+        subject = field("subject")
+
+        if not username or not record.get("password"):
+            errors.append((line, "Username and password are required"))
+        elif len(username) > 80:
+            errors.append((line, "Username is longer than 80 characters"))
+        elif role not in ROLES:
+            errors.append((line, f"Unknown role {role!r}"))
+        elif subject and subject not in subjects:
+            errors.append((line, f"Unknown subject {subject!r}"))
+        elif username in seen:
+            errors.append((line, f"Username {username!r} appears twice in the file"))
+        else:
+            seen.add(username)
+            rows.append({
+                "line": line,
+                "username": username,
+                "password": record["password"],
+                "role": role,
+                "year": field("year") or None,
+                "division": field("division") or None,
+                "phone": field("phone") or None,
+                "subject_id": subjects.get(subject) if role == "teacher" else None,
+                "is_active": True
+            })
+
+    return rows, errors
+
+
+def existing_usernames(usernames):
+    """The subset of `usernames` already taken, in one query per IN_CHUNK names."""
+    taken = set()
+    for i in range(0, len(usernames), IN_CHUNK):
+        taken.update(
+            name for (name,) in db.session.query(User.username)
+            .filter(User.username.in_(usernames[i:i + IN_CHUNK]))
+        )
+    return taken
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash each password (PASSWORD_HASH_METHOD), across a process pool.
+
+    Hashing is deliberately slow and CPU-bound, so it is the cost of an
+    import; small batches are hashed in-process. The pool is spawned, not
+    forked: web imports run on a thread of a multi-threaded worker, and a
+    forked child can inherit locks other threads were holding.
+    """
+    hasher = password_hasher.hasher()
+    workers = workers or os.cpu_count() or 1
+    if len(passwords) < POOL_THRESHOLD or workers == 1:
+        return [hasher(p) for p in passwords]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return list(pool.map(hasher, passwords, chunksize=16))
+
+
+def import_users(stream, workers=None, batch=IMPORT_BATCH):
+    """Create the users of a CSV in batched transactions.
+
+    Returns {"created", "errors", "seconds", "per_sec"}; errors are
+    (line, message) and every other row is imported.
+    """
+    started = time.perf_counter()
+    rows, errors = read_import(stream)
+
+    taken = existing_usernames([r["username"] for r in rows])
+    errors += [
+        (r["line"], f"Username {r['username']!r} already exists")
+        for r in rows if r["username"] in taken
+    ]
+    rows = [r for r in rows if r["username"] not in taken]
+
+    for row, hashed in zip(rows, hash_passwords([r["password"] for r in rows], workers)):
+        row["password"] = hashed
+
+    created = 0
+    for i in range(0, len(rows), batch):
+        chunk = rows[i:i + batch]
+        try:
+            _insert_users(chunk)
+            created += len(chunk)
+        except IntegrityError:
+            # a username was taken since the check; find it row by row
+            db.session.rollback()
+            for row in chunk:
+                try:
+                    _insert_users([row])
+                    created += 1
+                except IntegrityError:
+                    db.session.rollback()
+                    errors.append(
+                        (row["line"], f"Username {row['username']!r} already exists")
+                    )
+
+    seconds = time.perf_counter() - started
+    return {
+        "created": created,
+        "errors": sorted(errors),
+        "seconds": round(seconds, 2),
+        "per_sec": round(created / seconds, 1) if seconds else 0.0
+    }
+
+
+def _insert_users(rows):
+    db.session.execute(
+        insert(User), [{k: v for k, v in r.items() if k != "line"} for r in rows]
+    )
+    bump("users")
+    db.session.commit()
+
+
+# =========================
+# BACKGROUND IMPORTS
+# =========================
+# Hashing makes a large import outlast a request, so the web form runs it
+# here. State lives on disk, like the PDF exports, so every gunicorn worker
+# can report on it:
+#   <key>.csv      uploaded file, removed once the import ends
+#   <key>.pending  import in progress
+#   <key>.json     result of import_users, or {"error": message}
+def import_dir(app):
+    path = app.config.get("IMPORT_DIR") or os.path.join(app.instance_path, "imports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def valid_import_key(key):
+    return re.fullmatch(r"import-[0-9a-f]{24}", key) is not None
+
+
+def import_status(app, key):
+    """("pending" | "ready" | "failed" | "missing", result or None)."""
+    base = os.path.join(import_dir(app), key)
+
+    if os.path.exists(base + ".json"):
+        with open(base + ".json") as f:
+            result = json.load(f)
+        return ("failed" if "error" in result else "ready"), result
+    if os.path.exists(base + ".pending"):
+        if time.time() - os.path.getmtime(base + ".pending") < IMPORT_TIMEOUT:
+            return "pending", None
+    return "missing", None
+
+
+def start_import(app, data):
+    """Queue an import of the CSV bytes `data`; returns its key."""
+    directory = import_dir(app)
+    _prune_imports(directory)
+
+    key = f"import-{secrets.token_hex(12)}"
+    base = os.path.join(directory, key)
+    with open(base + ".csv", "wb") as f:
+        f.write(data)
+    open(base + ".pending", "w").close()
+
+    _executor.submit(_run_import, app, key)
+    return key
+
+
+def _run_import(app, key):
+    base = os.path.join(import_dir(app), key)
+
+    try:
+        with app.app_context():
+            with open(base + ".csv", encoding="utf-8-sig", newline="") as f:
+                result = import_users(f)
+    except (UnicodeDecodeError, csv.Error) as e:
+        result = {"error": f"Could not read the file: {e}"}
+    except Exception as e:
+        app.logger.exception("User import %s failed", key)
+        result = {"error": str(e)}
+
+    tmp = base + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp, base + ".json")
+    for suffix in (".csv", ".pending"):
+        if os.path.exists(base + suffix):
+            os.remove(base + suffix)
+
+
+def _prune_imports(directory):
+    """Drop results older than IMPORT_KEEP."""
+    cutoff = time.time() - IMPORT_KEEP
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        try:
+            if filename.endswith(".json") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,82 @@
+from flask import g, has_app_context
+
+from models import db, DataVersion, upsert
+
+# read along with whatever a request asks for first, so the rest of the
+# request finds them already loaded
+PREFETCH = ("attendance", "users", "subjects")
+
+
+# =========================
+# DATA VERSIONS
+# =========================
+def student_version_key(student_id):
+    """Bumped with every change to one student's marks."""
+    return f"attendance:student:{student_id}"
+
+
+def class_version_key(year, division):
+    """Bumped with every change to the marks of one class."""
+    return f"attendance:class:{year or ''}-{division or ''}"
+
+
+def bump(*names):
+    """Increment the named versions inside the caller's transaction."""
+    if not names:
+        return
+
+    insert = upsert(DataVersion)
+    stmt = insert.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": DataVersion.version + 1}
+    )
+    db.session.execute(stmt, [{"name": n, "version": 1} for n in names])
+
+    memo = _memo()
+    for n in names:
+        memo.pop(n, None)
+
+
+def next_version(name):
+    """Bump `name` and return its new value, inside the caller's transaction.
+
+    The counter row stays locked until commit, so values are handed out
+    (and become visible) in commit order.
+    """
+    bump(name)
+    return db.session.query(DataVersion.version).filter_by(name=name).scalar()
+
+
+def current(*names):
+    """The named versions as a tuple; unknown names are 0.
+
+    Versions are remembered for the rest of the app context (one request),
+    so a request pays for at most one query here.
+    """
+    memo = _memo()
+    missing = [n for n in names if n not in memo]
+
+    if missing:
+        wanted = set(missing) | (set(PREFETCH) - set(memo))
+        found = dict(
+            db.session.query(DataVersion.name, DataVersion.version)
+            .filter(DataVersion.name.in_(wanted))
+        )
+        for n in wanted:
+            memo[n] = found.get(n, 0)
+
+    return tuple(memo[n] for n in names)
+
+
+def forget():
+    """Drop the versions remembered so far in this app context."""
+    if has_app_context():
+        g.pop("_versions", None)
+
+
+def _memo():
+    if not has_app_context():
+        return {}
+    if "_versions" not in g:
+        g._versions = {}
+    return g._versions